@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+
+"""annotation_memory.py
+
+Measures the memory used by hydrated annotations in a 100k annotation
+metadata document.
+
+The annotations are compared with the equivalent instance __dict__ layout
+(an attribute dict per annotation and a FIELD_DICT copy per field) that the
+annotation classes used before they were given __slots__ and FieldRecords.
+
+Examples:
+    python benchmarks/annotation_memory.py
+    python benchmarks/annotation_memory.py --annotations 10000
+
+"""
+import argparse
+import copy
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+from data_manager_metadata.metadata import FIELD_DICT, FieldRecord, Metadata
+
+_FIELDS = {
+    'smiles': {'type': 'string', 'description': 'Standardized smiles'},
+    'uuid': {'type': 'string', 'description': 'Molecule Identifier'},
+    'score': {'type': 'number', 'description': 'Docking score'},
+}
+
+
+def _annotation_rows(count: int) -> list:
+    """Return a list of count annotation dicts cycling through the
+    annotation types.
+    """
+    rows = []
+    for i in range(count):
+        created = '2022-05-04T12:%02d:%02d.%06d' % (i // 60 % 60, i % 60, i)
+        if i % 3 == 0:
+            rows.append(
+                {
+                    'type': 'PropertyChangeAnnotation',
+                    'created': created,
+                    'annotation_version': '0.0.1',
+                    'meta_property': 'description',
+                    'previous_value': 'Description %d' % i,
+                }
+            )
+        elif i % 3 == 1:
+            rows.append(
+                {
+                    'type': 'FieldsDescriptorAnnotation',
+                    'created': created,
+                    'annotation_version': '0.0.1',
+                    'origin': 'Supplier 1',
+                    'description': 'A description',
+                    'fields': copy.deepcopy(_FIELDS),
+                }
+            )
+        else:
+            rows.append(
+                {
+                    'type': 'ServiceExecutionAnnotation',
+                    'created': created,
+                    'annotation_version': '0.0.1',
+                    'service': 'run-smina',
+                    'service_version': '1.0.0',
+                    'service_user': 'bob',
+                    'service_name': 'run-smina',
+                    'service_ref': 'https://example.com/smina.html',
+                    'service_parameters': {'exhaustiveness': 8},
+                    'origin': 'squonk2-job',
+                    'description': 'Run smina docking',
+                    'fields': copy.deepcopy(_FIELDS),
+                }
+            )
+    return rows
+
+
+class _DictLayout:
+    """An object with an instance __dict__ used to model the unslotted
+    annotation layout.
+    """
+
+
+def _slot_names(anno) -> list:
+    """Return the names of all the slots of an annotation"""
+    names = []
+    for cls in type(anno).__mro__:
+        names.extend(getattr(cls, '__slots__', ()))
+    return names
+
+
+def _slotted_layout(annotations: list) -> list:
+    """Return copies of the annotations in the slotted layout, sharing the
+    same attribute values.
+    """
+    copies = []
+    for anno in annotations:
+        obj = object.__new__(type(anno))
+        for name in _slot_names(anno):
+            setattr(obj, name, getattr(anno, name))
+        if hasattr(anno, 'fields'):
+            obj.fields = {
+                prop: FieldRecord(
+                    record.type, record.description, record.required, record.active
+                )
+                for prop, record in anno.fields.items()
+            }
+        copies.append(obj)
+    return copies
+
+
+def _dict_layout(annotations: list) -> list:
+    """Return copies of the annotations in the unslotted layout, sharing the
+    same attribute values.
+    """
+    copies = []
+    for anno in annotations:
+        obj = _DictLayout()
+        for name in _slot_names(anno):
+            setattr(obj, name, getattr(anno, name))
+        if hasattr(anno, 'fields'):
+            fields = {}
+            for prop, record in anno.fields.items():
+                row = copy.deepcopy(FIELD_DICT)
+                row['type'] = record.type
+                row['description'] = record.description
+                row['required'] = record.required
+                row['active'] = record.active
+                fields[prop] = row
+            obj.fields = fields
+        copies.append(obj)
+    return copies
+
+
+def _traced(func, *args) -> int:
+    """Return the traced memory held by the result of func"""
+    gc.collect()
+    tracemalloc.start()
+    result = func(*args)
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser('Annotation memory benchmark')
+    parser.add_argument('--annotations', type=int, default=100000)
+    args = parser.parse_args()
+
+    metadata = Metadata(
+        'dm', 'dm', 'dm', 'dm', annotations=_annotation_rows(args.annotations)
+    )
+
+    # Both layouts are built from the hydrated annotations so that only the
+    # containers are measured and the attribute values are shared.
+    count = len(metadata.annotations)
+    unslotted_size = _traced(_dict_layout, metadata.annotations)
+    slotted_size = _traced(_slotted_layout, metadata.annotations)
+    saving = unslotted_size - slotted_size
+
+    print('Annotations:      %d' % count)
+    print('__dict__ layout:  %.1f bytes/annotation' % (unslotted_size / count))
+    print('__slots__ layout: %.1f bytes/annotation' % (slotted_size / count))
+    print(
+        'Saving:           %.1f bytes/annotation (%.0f%%)'
+        % (saving / count, 100.0 * saving / unslotted_size)
+    )
+
+
+if __name__ == '__main__':
+    main()
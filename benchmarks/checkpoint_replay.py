@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+
+"""checkpoint_replay.py
+
+Measures the time to load a metadata document and produce its json schema
+with and without a checkpoint of the compiled fields and latest labels.
+
+The document is parsed before the timing starts, so the times are for
+Metadata.from_trusted_dict() and get_json_schema() only.
+
+Examples:
+    python benchmarks/checkpoint_replay.py
+    python benchmarks/checkpoint_replay.py --annotations 1000 10000 --repeat 5
+
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+from annotation_memory import _annotation_rows
+from data_manager_metadata.metadata import Metadata
+
+
+def _best_time(func, repeat: int) -> float:
+    """Return the best time in seconds for one call of func"""
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def _label_rows(count: int) -> list:
+    """Return a list of count label dicts re-applying a small set of labels"""
+    return [
+        {
+            'type': 'LabelAnnotation',
+            'created': '2022-05-04T13:%02d:%02d.%06d' % (i // 60 % 60, i % 60, i),
+            'annotation_version': '0.0.1',
+            'label': 'label%d' % (i % 20),
+            'value': 'value %d' % i,
+            'active': True,
+            'reference': '',
+        }
+        for i in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser('Checkpoint replay benchmark')
+    parser.add_argument(
+        '--annotations', type=int, nargs='+', default=[1000, 10000, 100000]
+    )
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print('%12s %16s %16s' % ('annotations', 'replay (ms)', 'checkpoint (ms)'))
+    for count in args.annotations:
+        metadata = Metadata(
+            'dm',
+            'dm',
+            'dm',
+            'dm',
+            annotations=_annotation_rows(count),
+            labels=_label_rows(count // 10),
+        )
+        schema = metadata.get_json_schema()
+        plain_dict = json.loads(metadata.to_json())
+        checkpoint_dict = json.loads(metadata.to_json(checkpoint=True))
+        assert Metadata.from_trusted_dict(checkpoint_dict).get_json_schema() == schema
+
+        times = [
+            _best_time(
+                lambda d=metadata_dict: Metadata.from_trusted_dict(d).get_json_schema(),
+                args.repeat,
+            )
+            * 1000
+            for metadata_dict in (plain_dict, checkpoint_dict)
+        ]
+        print('%12d %16.1f %16.1f' % (count, times[0], times[1]))
+
+
+if __name__ == '__main__':
+    main()
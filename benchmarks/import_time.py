@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+
+"""import_time.py
+
+Measures the cold import time of a module with python -X importtime and
+fails if it is above a threshold, or if the import pulls in a module that
+should only be imported when it is used.
+
+Each import runs in a new interpreter. The bytecode is cached in a temporary
+directory (with -X pycache_prefix) by a first, untimed, import, so that the
+times do not include compiling the source. The best time of the repeats is
+compared with the threshold.
+
+Examples:
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --module data_manager_metadata.metadata --max-ms 40
+
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The modules that data_manager_metadata only imports when they are used.
+_LAZY_MODULES = ['yaml', 'multiprocessing']
+
+
+def _import_times(module: str, pycache_dir: str) -> dict:
+    """Return the cumulative import time in microseconds of each module
+    imported by a new interpreter importing module.
+    """
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    result = subprocess.run(
+        [
+            sys.executable,
+            '-X',
+            'importtime',
+            '-X',
+            'pycache_prefix=%s' % pycache_dir,
+            '-c',
+            'import %s' % module,
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=_ROOT,
+        env=env,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, name = line[len('import time:') :].split('|')
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser('Import time benchmark')
+    parser.add_argument('--module', default='data_manager_metadata.data_tier_api')
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--max-ms', type=float, default=50.0)
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as pycache_dir:
+        _import_times(args.module, pycache_dir)
+        runs = [_import_times(args.module, pycache_dir) for _ in range(args.repeat)]
+    best = min(runs, key=lambda times: times[args.module])
+    best_ms = best[args.module] / 1000
+
+    print('%s: %.1f ms (best of %d)' % (args.module, best_ms, args.repeat))
+    for name, cumulative in sorted(best.items(), key=lambda item: -item[1])[
+        1 : args.top + 1
+    ]:
+        print('  %-40s %8.1f ms' % (name, cumulative / 1000))
+
+    failed = False
+    lazy_imported = [
+        name
+        for name in _LAZY_MODULES
+        if any(imported.split('.')[0] == name for imported in best)
+    ]
+    if lazy_imported:
+        print('FAIL: imported %s' % ', '.join(lazy_imported))
+        failed = True
+    if best_ms > args.max_ms:
+        print('FAIL: above the threshold of %.1f ms' % args.max_ms)
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+
+"""md_manage_batch.py
+
+Measures the time to create annotations by running md_manage.py once for
+each annotation, against running one md_manage.py batch for all of them.
+
+Every third annotation is a ServiceExecution annotation that reads the
+test job definition yaml, the others are labels. The annotations are
+shared between a few results files. The per-call runs use --json-lines so
+that they append to the annotations files rather than rewrite them.
+
+Examples:
+    python benchmarks/md_manage_batch.py
+    python benchmarks/md_manage_batch.py --count 100 --files 1
+
+"""
+import argparse
+import os
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_MD_MANAGE = os.path.join(_ROOT, 'md_manage.py')
+_YAML = os.path.join(_ROOT, 'test', 'input', 'virtual-screening.yaml')
+
+
+def _specs(out_dir: str, count: int, files: int) -> list:
+    """Return count md_manage.py commands spread over a number of results files"""
+    specs = []
+    for i in range(count):
+        results = os.path.join(out_dir, 'results%d.sdf' % (i % files))
+        if i % 3 == 2:
+            specs.append(
+                'se %s -su=bob -sys=run-smina -sy=%s -sp index=%d -fo=bench -fd=smina'
+                ' -fp=score,number,Score,true,true -jl' % (results, _YAML, i)
+            )
+        else:
+            specs.append('lb %s label%d -lv=value%d -jl' % (results, i % 20, i))
+    return specs
+
+
+def _count_lines(out_dir: str) -> int:
+    """Return the number of annotations written to the JSON Lines files"""
+    lines = 0
+    for name in os.listdir(out_dir):
+        if name.endswith('.annotations'):
+            with open(os.path.join(out_dir, name), 'rt') as annotations:
+                lines += sum(1 for _ in annotations)
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser('md_manage.py batch benchmark')
+    parser.add_argument('--count', type=int, default=1000)
+    parser.add_argument('--files', type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as per_call_dir:
+        start = time.perf_counter()
+        for spec in _specs(per_call_dir, args.count, args.files):
+            subprocess.run(
+                [sys.executable, _MD_MANAGE] + shlex.split(spec), check=True, cwd=_ROOT
+            )
+        per_call_time = time.perf_counter() - start
+        assert _count_lines(per_call_dir) == args.count
+
+    with tempfile.TemporaryDirectory() as batch_dir:
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, _MD_MANAGE, 'batch'],
+            input='\n'.join(_specs(batch_dir, args.count, args.files)),
+            text=True,
+            check=True,
+            cwd=_ROOT,
+        )
+        batch_time = time.perf_counter() - start
+        assert _count_lines(batch_dir) == args.count
+
+    print('Annotations: %d (%d files)' % (args.count, args.files))
+    print(
+        '  %-10s %10.2f s %10.2f ms/annotation'
+        % ('per call', per_call_time, per_call_time * 1000 / args.count)
+    )
+    print(
+        '  %-10s %10.2f s %10.2f ms/annotation (x%.0f)'
+        % (
+            'batch',
+            batch_time,
+            batch_time * 1000 / args.count,
+            per_call_time / batch_time,
+        )
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+
+"""parallel_schemas.py
+
+Measures the throughput of recompute_version_schemas with different numbers
+of worker processes, against computing the schemas serially with
+get_version_schema.
+
+Each dataset has labels and each of its versions has FieldsDescriptor and
+ServiceExecution annotations, so that the schemas take a realistic time to
+compute.
+
+Examples:
+    python benchmarks/parallel_schemas.py
+    python benchmarks/parallel_schemas.py --datasets 20 --versions 50 --processes 1 2 4 8
+
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+from annotation_memory import _annotation_rows
+from data_manager_metadata.data_tier_api import (
+    get_version_schema,
+    recompute_version_schemas,
+)
+from data_manager_metadata.metadata import Metadata
+
+
+def _metadata_pairs(datasets: int, versions: int, annotations: int) -> list:
+    """Return the (dataset metadata, version metadata) pairs of the versions
+    of some datasets.
+    """
+    version_dict = Metadata(
+        'dm', 'dm', 'dm', 'dm', annotations=_annotation_rows(annotations)
+    ).to_dict()
+    pairs = []
+    for dataset in range(datasets):
+        dataset_dict = Metadata(
+            'dataset %d' % dataset,
+            'dataset-%d' % dataset,
+            'dm',
+            'dm',
+            labels=[
+                {'type': 'LabelAnnotation', 'label': 'label%d' % i, 'value': str(i)}
+                for i in range(20)
+            ],
+        ).to_dict()
+        pairs.extend((dataset_dict, version_dict) for _ in range(versions))
+    return pairs
+
+
+def main():
+    parser = argparse.ArgumentParser('Parallel schema recomputation benchmark')
+    parser.add_argument('--datasets', type=int, default=10)
+    parser.add_argument('--versions', type=int, default=40)
+    parser.add_argument('--annotations', type=int, default=300)
+    parser.add_argument(
+        '--processes', type=int, nargs='+', default=sorted({1, 2, os.cpu_count()})
+    )
+    parser.add_argument('--chunk-size', type=int, default=16)
+    args = parser.parse_args()
+
+    pairs = _metadata_pairs(args.datasets, args.versions, args.annotations)
+    print(
+        'Versions: %d (%d datasets), CPUs: %d'
+        % (len(pairs), args.datasets, os.cpu_count())
+    )
+
+    start = time.perf_counter()
+    expected = [get_version_schema(*pair) for pair in pairs]
+    serial_time = time.perf_counter() - start
+    print(
+        '  %-20s %10.1f versions/s' % ('get_version_schema', len(pairs) / serial_time)
+    )
+
+    for processes in args.processes:
+        start = time.perf_counter()
+        schemas = list(
+            recompute_version_schemas(pairs, processes, chunk_size=args.chunk_size)
+        )
+        elapsed = time.perf_counter() - start
+        assert schemas == expected
+        print(
+            '  %-20s %10.1f versions/s (x%.1f)'
+            % (
+                '%d process(es)' % processes,
+                len(pairs) / elapsed,
+                serial_time / elapsed,
+            )
+        )
+
+
+if __name__ == '__main__':
+    main()
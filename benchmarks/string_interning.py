@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+
+"""string_interning.py
+
+Measures the memory used by many hydrated metadata documents with and
+without the interning of repeated annotation strings.
+
+Each document is loaded from its own JSON text, as it would be when it is
+read from a file or the data tier, so no strings are shared between the
+documents unless they are interned.
+
+Examples:
+    python benchmarks/string_interning.py
+    python benchmarks/string_interning.py --documents 100 --annotations 300
+
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position,protected-access
+from annotation_memory import _annotation_rows
+from data_manager_metadata import metadata as metadata_module
+from data_manager_metadata.metadata import Metadata
+
+
+def _load_documents(texts: list) -> list:
+    """Return hydrated Metadata for each JSON text"""
+    documents = []
+    for text in texts:
+        document = Metadata(**json.loads(text))
+        document.get_labels()
+        documents.append(document)
+    return documents
+
+
+def _traced(texts: list) -> int:
+    """Return the traced memory held by the loaded documents"""
+    gc.collect()
+    tracemalloc.start()
+    documents = _load_documents(texts)
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del documents
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser('String interning benchmark')
+    parser.add_argument('--documents', type=int, default=200)
+    parser.add_argument('--annotations', type=int, default=500)
+    args = parser.parse_args()
+
+    text = json.dumps(
+        Metadata(
+            'dm', 'dm', 'dm', 'dm', annotations=_annotation_rows(args.annotations)
+        ).to_dict()
+    )
+    texts = [text] * args.documents
+
+    metadata_module._intern = lambda value: value
+    plain_size = _traced(texts)
+    metadata_module._intern = metadata_module._intern_string
+    interned_size = _traced(texts)
+    saving = plain_size - interned_size
+
+    annotations = args.documents * args.annotations
+    print('Documents:   %d x %d annotations' % (args.documents, args.annotations))
+    print('Not interned: %.1f bytes/annotation' % (plain_size / annotations))
+    print('Interned:     %.1f bytes/annotation' % (interned_size / annotations))
+    print(
+        'Saving:       %.1f bytes/annotation (%.0f%%)'
+        % (saving / annotations, 100.0 * saving / plain_size)
+    )
+
+
+if __name__ == '__main__':
+    main()
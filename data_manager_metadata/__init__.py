@@ -0,0 +1,49 @@
+"""Data Manager Metadata.
+
+    The main classes are available from the package, e.g.
+    data_manager_metadata.Metadata, as are its modules. They are imported when
+    they are first used, so importing the package (or one of its modules) does
+    not import the others.
+"""
+import importlib
+
+# The names exported by the package and the modules they are imported from.
+_EXPORTS = {
+    'AnnotationValidationError': 'exceptions',
+    'FieldsDescriptorAnnotation': 'metadata',
+    'LabelAnnotation': 'metadata',
+    'Metadata': 'metadata',
+    'SchemaCache': 'schema_cache',
+    'ServiceExecutionAnnotation': 'metadata',
+}
+
+_MODULES = [
+    'annotation_utils',
+    'binary',
+    'codec',
+    'data_tier_api',
+    'exceptions',
+    'json_stream',
+    'metadata',
+    'schema_cache',
+    'validators',
+]
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name: str):
+    """Import an exported name or a module when it is first used"""
+    if name in _EXPORTS:
+        module = importlib.import_module('.' + _EXPORTS[name], __name__)
+        value = getattr(module, name)
+    elif name in _MODULES:
+        value = importlib.import_module('.' + name, __name__)
+    else:
+        raise AttributeError('module %r has no attribute %r' % (__name__, name))
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS) | set(_MODULES))
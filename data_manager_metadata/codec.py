@@ -0,0 +1,61 @@
+"""Data Manager Metadata JSON codec.
+
+    All JSON serialisation in the library goes through this module, which
+    uses the standard library json module. It is kept as a single place to
+    change how JSON is written and read, and for canonical_dumps().
+
+    Faster parsers are not used. orjson turns integers that do not fit in 64
+    bits into floats, and checking each document for them takes away its
+    gain. ujson accepts some text that the json module rejects.
+
+    canonical_dumps() is a deterministic encoding for digests and
+    comparisons: keys are sorted, there is no whitespace and datetimes are
+    always written with microseconds.
+"""
+import datetime
+import json
+from typing import Any
+
+# The format of datetimes in the canonical encoding. Unlike isoformat() this
+# always includes the microseconds.
+CANONICAL_DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+
+def dumps(obj: Any, sort_keys: bool = False) -> str:
+    """Serialize an object to a JSON string, with the keys of dictionaries
+    sorted if sort_keys is True.
+    """
+    return json.dumps(obj, sort_keys=sort_keys)
+
+
+def _canonical_default(obj: Any) -> str:
+    """Returns the canonical form of a datetime"""
+    if isinstance(obj, datetime.datetime):
+        return obj.strftime(CANONICAL_DATETIME_FORMAT)
+    raise TypeError(
+        'Object of type %s is not JSON serializable' % obj.__class__.__name__
+    )
+
+
+def canonical_dumps(obj: Any) -> str:
+    """Serialize an object to a canonical JSON string, with sorted keys, no
+    whitespace and datetime objects in CANONICAL_DATETIME_FORMAT.
+    """
+    return json.dumps(
+        obj, sort_keys=True, separators=(',', ':'), default=_canonical_default
+    )
+
+
+def dump(obj: Any, fp):
+    """Serialize an object as JSON to a text file (or file-like object)"""
+    json.dump(obj, fp)
+
+
+def loads(text) -> Any:
+    """Deserialize a JSON string (or bytes)"""
+    return json.loads(text)
+
+
+def load(fp) -> Any:
+    """Deserialize JSON from a text file (or file-like object)"""
+    return loads(fp.read())
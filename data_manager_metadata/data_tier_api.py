@@ -14,12 +14,16 @@
     as a dataset.
     - The job related annotations that are added to the metadata depend on the configuration
     and specification of the job.
+    - dataset and version metadata are read back from the data tier, where they were saved
+    after being validated, so they are loaded with Metadata.from_trusted_dict. They are
+    returned with a checkpoint (see Metadata.to_dict) so that loading them does not replay
+    every annotation and label. Travelling metadata may have been changed in a project so it
+    is always validated, and it has no checkpoint.
 
 """
-from typing import Any, Dict, Tuple, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Tuple, Optional, Union
 import copy
 import os
-import json
 import logging
 
 from data_manager_metadata.metadata import (
@@ -27,14 +31,49 @@ from data_manager_metadata.metadata import (
     ServiceExecutionAnnotation,
     LabelAnnotation,
 )
+from data_manager_metadata import codec
 from data_manager_metadata.exceptions import AnnotationValidationError
+from data_manager_metadata.json_stream import read_metadata
+from data_manager_metadata.schema_cache import SchemaCache, metadata_key
 
+# No handler is added to the logger when the module is imported, so logging is
+# left to the application (see configure_basic_logger).
 basic_logger = logging.getLogger('basic')
-basic_logger.setLevel(logging.INFO)
-basic_handler = logging.StreamHandler()
-basic_formatter = logging.Formatter('%(asctime)s # %(levelname)s %(message)s')
-basic_handler.setFormatter(basic_formatter)
-basic_logger.addHandler(basic_handler)
+_basic_handler: Optional[logging.Handler] = None
+
+# The default number of versions in each task of recompute_version_schemas.
+_SCHEMA_CHUNK_SIZE: int = 64
+
+# The metadata items that are lists of annotations, which are only appended
+# to, so deltas hold the appended annotations rather than the whole list.
+_DELTA_LISTS = ['annotations', 'labels']
+
+# The checkpoint (see Metadata.to_dict) is as large as the compiled fields and
+# latest labels, so it is left out of deltas. A checkpoint taken at fewer
+# annotations and labels still matches the appended lists (only the entries
+# after it are replayed), so the stored one is kept unless a list is replaced.
+_DELTA_CHECKPOINT = 'checkpoint'
+
+# The cache of the version and travelling json schemas, keyed by the kind of
+# schema and the metadata keys of the dataset and version metadata. Its
+# counters can be read with schema_cache.stats().
+schema_cache = SchemaCache()
+
+
+def configure_basic_logger(level: int = logging.INFO) -> logging.Logger:
+    """Send the messages of the basic logger to stderr, with their times and
+    levels. The handler is only added once, however often this is called.
+    """
+    global _basic_handler  # pylint: disable=global-statement
+
+    basic_logger.setLevel(level)
+    if _basic_handler is None:
+        _basic_handler = logging.StreamHandler()
+        _basic_handler.setFormatter(
+            logging.Formatter('%(asctime)s # %(levelname)s %(message)s')
+        )
+        basic_logger.addHandler(_basic_handler)
+    return basic_logger
 
 
 def get_metadata_filenames(filepath: str) -> Tuple[str, str]:
@@ -53,6 +92,112 @@ def get_metadata_filenames(filepath: str) -> Tuple[str, str]:
     return filename_stem + _METADATA_EXT, filename_stem + _SCHEMA_EXT
 
 
+# Delta Methods
+def _delta_path(*keys: Any) -> str:
+    """Returns a JSON pointer (RFC 6901) from the keys of a path"""
+    return ''.join('/' + str(key).replace('~', '~0').replace('/', '~1') for key in keys)
+
+
+def create_delta(
+    original_metadata: Dict[str, Any], metadata: Dict[str, Any]
+) -> List[Dict[str, Any]]:
+    """Returns the changes from a metadata dictionary to an updated version of
+    it as a list of JSON Patch (RFC 6902) operations, so that only the
+    changes need to be written.
+
+    - Each changed, added or removed item (other than the annotations and
+    labels) is a 'replace', 'add' or 'remove' operation on the item.
+    - Each annotation or label appended is an 'add' operation to the end of
+    the list ('/annotations/-' or '/labels/-'). Annotations and labels are
+    only ever appended, so the lists are compared by their lengths and the
+    last entry of the original list. If a list is shorter, or that entry has
+    changed (for example after Metadata.compact), the list is replaced.
+    - The checkpoint is not part of the delta, so the checkpoint the original
+    metadata was stored with is kept. It is removed if a list is replaced,
+    as it no longer matches.
+
+    Args:
+        original metadata dict
+        updated metadata dict
+
+    Returns:
+        list of operations
+    """
+    delta = []
+    replaced = False
+    for key, value in metadata.items():
+        if key == _DELTA_CHECKPOINT:
+            continue
+        if key not in original_metadata:
+            delta.append({'op': 'add', 'path': _delta_path(key), 'value': value})
+        elif key in _DELTA_LISTS and isinstance(value, list):
+            original_list = original_metadata[key]
+            if (
+                not isinstance(original_list, list)
+                or len(value) < len(original_list)
+                or (
+                    original_list and value[len(original_list) - 1] != original_list[-1]
+                )
+            ):
+                delta.append(
+                    {'op': 'replace', 'path': _delta_path(key), 'value': value}
+                )
+                replaced = True
+                continue
+            for entry in value[len(original_list) :]:
+                delta.append(
+                    {'op': 'add', 'path': _delta_path(key, '-'), 'value': entry}
+                )
+        elif original_metadata[key] != value:
+            delta.append({'op': 'replace', 'path': _delta_path(key), 'value': value})
+
+    for key in original_metadata:
+        if key not in metadata or (key == _DELTA_CHECKPOINT and replaced):
+            delta.append({'op': 'remove', 'path': _delta_path(key)})
+
+    return delta
+
+
+def apply_delta(
+    metadata: Dict[str, Any], delta: List[Dict[str, Any]]
+) -> Dict[str, Any]:
+    """Applies a delta returned by create_delta (or a patch function) to a
+    metadata dictionary. The dictionary is not changed.
+
+    Args:
+        metadata dict
+        delta (list of operations)
+
+    Returns:
+        the updated metadata dict
+
+    Raises:
+        ValueError if an operation is not one that create_delta returns
+    """
+    updated = dict(metadata)
+    # The lists that have been copied, so that they can be appended to.
+    copied = set()
+    for operation in delta:
+        keys = [
+            key.replace('~1', '/').replace('~0', '~')
+            for key in operation.get('path', '').split('/')[1:]
+        ]
+        op = operation.get('op')
+        if len(keys) == 1 and op in ('add', 'replace'):
+            updated[keys[0]] = operation['value']
+            copied.discard(keys[0])
+        elif len(keys) == 1 and op == 'remove':
+            updated.pop(keys[0], None)
+        elif len(keys) == 2 and keys[1] == '-' and op == 'add':
+            if keys[0] not in copied:
+                updated[keys[0]] = list(updated.get(keys[0]) or [])
+                copied.add(keys[0])
+            updated[keys[0]].append(operation['value'])
+        else:
+            raise ValueError('Unsupported delta operation %s' % operation)
+    return updated
+
+
 # Dataset Methods
 def post_dataset_metadata(
     dataset_name: str,
@@ -89,7 +234,7 @@ def post_dataset_metadata(
     metadata = Metadata(
         dataset_name, dataset_id, description, created_by, **metadata_params
     )
-    return metadata.to_dict(), metadata.get_json_schema()
+    return metadata.to_dict(checkpoint=True), metadata.get_json_schema()
 
 
 def post_version_metadata(
@@ -119,14 +264,16 @@ def post_version_metadata(
         **metadata_params,
     )
 
-    return version_metadata.to_dict(), get_version_schema(
-        dataset_metadata, version_metadata.to_dict()
-    )
+    version_dict = version_metadata.to_dict(checkpoint=True)
+    return version_dict, get_version_schema(dataset_metadata, version_dict)
 
 
 def patch_dataset_metadata(
-    dataset_metadata: Dict[str, Any], **metadata_params: Any
-) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    dataset_metadata: Dict[str, Any], with_delta: bool = False, **metadata_params: Any
+) -> Union[
+    Tuple[Dict[str, Any], Dict[str, Any]],
+    Tuple[Dict[str, Any], Dict[str, Any], List[Dict[str, Any]]],
+]:
     """Update the metadata at the dataset level.
 
     The metadata_params will be limited to the following parameters:
@@ -137,14 +284,16 @@ def patch_dataset_metadata(
 
     Args:
         dataset_metadata: to be updated
+        with_delta (optional) also return the delta (see create_delta)
         **metadata_params (optional keyword arguments)
 
     Returns:
         metadata dict
         json_schema
+        delta (if with_delta is set)
     """
 
-    metadata = Metadata(**dataset_metadata)
+    metadata = Metadata.from_trusted_dict(dataset_metadata)
 
     if 'description' in metadata_params:
         metadata.set_description(metadata_params['description'])
@@ -152,7 +301,14 @@ def patch_dataset_metadata(
     if 'labels' in metadata_params:
         metadata.add_labels(metadata_params['labels'])
 
-    return metadata.to_dict(), metadata.get_json_schema()
+    metadata_dict = metadata.to_dict(checkpoint=True)
+    if with_delta:
+        return (
+            metadata_dict,
+            metadata.get_json_schema(),
+            create_delta(dataset_metadata, metadata_dict),
+        )
+    return metadata_dict, metadata.get_json_schema()
 
 
 def get_version_schema(
@@ -162,7 +318,8 @@ def get_version_schema(
 
     Note that this must be called for each version of the dataset after
     a patch_dataset_metadata call to update the json schema with any
-    inherited changed attributes from the dataset level.
+    inherited changed attributes from the dataset level
+    (see get_version_schemas to do this for all the versions at once).
 
     Args:
         version metedata
@@ -170,32 +327,199 @@ def get_version_schema(
     Returns:
         json_schema
     """
-    d_metadata = Metadata(**dataset_metadata)
-    v_metadata = Metadata(**version_metadata)
-    v_metadata.add_labels(d_metadata.get_labels())
+    return next(get_version_schemas(dataset_metadata, [version_metadata]))
+
+
+def get_version_schemas(
+    dataset_metadata: Dict[str, Any], version_metadata_list: Iterable[Dict[str, Any]]
+) -> Iterator[Dict[str, Any]]:
+    """Get the current json schema of each version of a dataset.
+
+    This is the same as calling get_version_schema for each version, but the
+    dataset metadata and its labels are only loaded once, and only if a
+    schema is not already in the schema cache.
 
+    Args:
+        dataset metadata
+        version metadata list (or any iterable)
+
+    Returns:
+        a generator of the json_schema of each version in turn
+    """
+    dataset_key = metadata_key(dataset_metadata)
+    labels = None
+    for version_metadata in version_metadata_list:
+        key = ('version', dataset_key, metadata_key(version_metadata))
+        schema = schema_cache.get(key)
+        if schema is None:
+            if labels is None:
+                labels = _label_objects(_dataset_labels(dataset_metadata))
+            schema = _version_schema(labels, version_metadata)
+            schema_cache.put(key, schema)
+        yield schema
+
+
+def _dataset_labels(dataset_metadata: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Returns the latest labels of the dataset that the versions inherit"""
+    return Metadata.from_trusted_dict(dataset_metadata).get_labels()
+
+
+def _label_objects(dataset_labels: List[Dict[str, Any]]) -> List[LabelAnnotation]:
+    """Returns the label annotations of the dataset labels. The labels are the
+    dictionaries of validated labels, so they can be created once and shared
+    by the versions.
+    """
+    return [LabelAnnotation.from_trusted_dict(label) for label in dataset_labels]
+
+
+def _version_schema(
+    labels: List[LabelAnnotation], version_metadata: Dict[str, Any]
+) -> Dict[str, Any]:
+    """Returns the json schema of a version with the dataset labels applied"""
+    v_metadata = Metadata.from_trusted_dict(version_metadata)
+    for label in labels:
+        v_metadata.add_label(label)
     return v_metadata.get_json_schema()
 
 
+# The label annotations of each dataset of recompute_version_schemas in a
+# worker process, set once when the worker starts (see
+# _init_version_schemas_worker).
+_worker_dataset_labels: List[List[LabelAnnotation]] = []
+
+
+def _init_version_schemas_worker(dataset_labels_list: List[List[Dict[str, Any]]]):
+    """Creates the label annotations of every dataset once in a worker
+    process of recompute_version_schemas.
+    """
+    global _worker_dataset_labels  # pylint: disable=global-statement
+
+    _worker_dataset_labels = [
+        _label_objects(dataset_labels) for dataset_labels in dataset_labels_list
+    ]
+
+
+def _version_schemas_task(
+    task: Tuple[int, List[Dict[str, Any]]]
+) -> List[Dict[str, Any]]:
+    """Returns the json schemas of a task of recompute_version_schemas in a
+    worker process, which is a tuple of the index of the dataset and a list of
+    its version metadata.
+    """
+    dataset_index, version_metadata_list = task
+    labels = _worker_dataset_labels[dataset_index]
+    return [
+        _version_schema(labels, version_metadata)
+        for version_metadata in version_metadata_list
+    ]
+
+
+def _version_schema_tasks(
+    metadata_pairs: Iterable[Tuple[Dict[str, Any], Dict[str, Any]]], chunk_size: int
+) -> Tuple[List[List[Dict[str, Any]]], List[Tuple[int, List[Dict[str, Any]]]]]:
+    """Returns the labels of each dataset and the tasks of
+    recompute_version_schemas. The labels of a dataset are found once for each
+    run of pairs with the same dataset metadata, and its versions are split
+    into tasks of up to chunk_size versions, each with the index of the
+    dataset labels.
+    """
+    dataset_labels_list: List[List[Dict[str, Any]]] = []
+    tasks: List[Tuple[int, List[Dict[str, Any]]]] = []
+    dataset_metadata = None
+    version_metadata_list: List[Dict[str, Any]] = []
+    for pair_dataset_metadata, version_metadata in metadata_pairs:
+        if not dataset_labels_list or not (
+            pair_dataset_metadata is dataset_metadata
+            or pair_dataset_metadata == dataset_metadata
+        ):
+            if version_metadata_list:
+                tasks.append((len(dataset_labels_list) - 1, version_metadata_list))
+                version_metadata_list = []
+            dataset_metadata = pair_dataset_metadata
+            dataset_labels_list.append(_dataset_labels(dataset_metadata))
+        version_metadata_list.append(version_metadata)
+        if len(version_metadata_list) >= chunk_size:
+            tasks.append((len(dataset_labels_list) - 1, version_metadata_list))
+            version_metadata_list = []
+    if version_metadata_list:
+        tasks.append((len(dataset_labels_list) - 1, version_metadata_list))
+    return dataset_labels_list, tasks
+
+
+def recompute_version_schemas(
+    metadata_pairs: Iterable[Tuple[Dict[str, Any], Dict[str, Any]]],
+    processes: Optional[int] = None,
+    chunk_size: int = _SCHEMA_CHUNK_SIZE,
+) -> Iterator[Dict[str, Any]]:
+    """Recompute the json schemas of many dataset versions in parallel, for
+    example after labels have changed or the library has been upgraded.
+
+    The versions are sent to a pool of worker processes in tasks of up to
+    chunk_size versions. The labels of each dataset are found once, in this
+    process, and are given to each worker once when it starts (the pool
+    initializer), so a task only holds the index of its dataset and the
+    version metadata. The pairs are therefore all read before the pool is
+    started. Pairs for the same dataset should be consecutive so that its
+    labels are only found once. The schema cache is not used, as the schemas
+    are being recomputed.
+
+    Args:
+        iterable of (dataset metadata, version metadata) pairs
+        processes (optional) the number of worker processes (the number of
+        CPUs if not given). If this is 1 the schemas are computed in this
+        process.
+        chunk_size (optional) the maximum number of versions in each task
+
+    Returns:
+        a generator of the json_schema of each version in the order of the
+        pairs
+    """
+    assert chunk_size > 0
+    dataset_labels_list, tasks = _version_schema_tasks(metadata_pairs, chunk_size)
+
+    if processes == 1:
+        labels_list = [_label_objects(labels) for labels in dataset_labels_list]
+        for dataset_index, version_metadata_list in tasks:
+            for version_metadata in version_metadata_list:
+                yield _version_schema(labels_list[dataset_index], version_metadata)
+        return
+
+    # multiprocessing is only needed here, so it is not imported with the module.
+    import multiprocessing  # pylint: disable=import-outside-toplevel
+
+    with multiprocessing.Pool(
+        processes,
+        initializer=_init_version_schemas_worker,
+        initargs=(dataset_labels_list,),
+    ) as pool:
+        for version_schemas in pool.imap(_version_schemas_task, tasks):
+            yield from version_schemas
+
+
 def patch_version_metadata(
     dataset_metadata: Dict[str, Any],
     version_metadata: Dict[str, Any],
+    with_delta: bool = False,
     **metadata_params: Any,
-) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+) -> Union[
+    Tuple[Dict[str, Any], Dict[str, Any]],
+    Tuple[Dict[str, Any], Dict[str, Any], List[Dict[str, Any]]],
+]:
     """Update metadata at the version level.
     This is only used for updating annotations and description.
 
     Args:
         dataset_metadata
         version_metadata
+        with_delta (optional) also return the delta (see create_delta)
         **metadata_params (optional keyword arguments)
 
     Returns:
         metadata dict
         json_schema
+        delta (if with_delta is set)
     """
-    d_metadata = Metadata(**dataset_metadata)
-    v_metadata = Metadata(**version_metadata)
+    v_metadata = Metadata.from_trusted_dict(version_metadata)
 
     if 'description' in metadata_params:
         v_metadata.set_description(metadata_params['description'])
@@ -203,12 +527,17 @@ def patch_version_metadata(
     if 'annotations' in metadata_params:
         v_metadata.add_annotations(metadata_params['annotations'])
 
-    # This adds the dataset labels to the version metadata so
-    # we can extract the json schema with both labels and annotations.
-    schema_metadata = Metadata(**v_metadata.to_dict())
-    schema_metadata.add_labels(d_metadata.get_labels())
-
-    return v_metadata.to_dict(), schema_metadata.get_json_schema()
+    # The json schema has the dataset labels as well as the version
+    # annotations (see get_version_schema).
+    version_dict = v_metadata.to_dict(checkpoint=True)
+    version_schema = get_version_schema(dataset_metadata, version_dict)
+    if with_delta:
+        return (
+            version_dict,
+            version_schema,
+            create_delta(version_metadata, version_dict),
+        )
+    return version_dict, version_schema
 
 
 # Travelling Metadata Methods
@@ -231,12 +560,20 @@ def get_travelling_metadata(
         travelling json_schema
     """
 
-    d_metadata = Metadata(**dataset_metadata)
-    v_metadata = Metadata(**version_metadata)
+    d_metadata = Metadata.from_trusted_dict(dataset_metadata)
+    v_metadata = Metadata.from_trusted_dict(version_metadata)
     d_metadata.add_annotations(v_metadata.get_annotations_dict())
     d_metadata.set_synchronised_datetime()
     d_metadata.set_dataset_version(v_metadata.get_dataset_version())
-    return d_metadata.to_dict(), d_metadata.get_json_schema()
+
+    # The schema does not depend on the synchronised datetime, so it can be
+    # cached for the dataset and version.
+    key = ('travelling', metadata_key(dataset_metadata), metadata_key(version_metadata))
+    schema = schema_cache.get(key)
+    if schema is None:
+        schema = d_metadata.get_json_schema()
+        schema_cache.put(key, schema)
+    return d_metadata.to_dict(), schema
 
 
 def post_travelling_metadata_to_new_dataset(
@@ -259,12 +596,9 @@ def post_travelling_metadata_to_new_dataset(
     """
 
     t_metadata = Metadata(**travelling_metadata)
-    synchronised_datetime = t_metadata.get_synchronised_datetime()
 
     d_metadata_params = {
-        'labels': copy.deepcopy(
-            t_metadata.get_labels_new_dataset(synchronised_datetime)
-        )
+        'labels': t_metadata.get_labels_new_dataset(t_metadata.synchronised_datetime)
     }
 
     v_metadata_params = {
@@ -287,22 +621,41 @@ def post_travelling_metadata_to_new_dataset(
 
 
 def patch_travelling_metadata(
-    travelling_metadata: Dict[str, Any], **metadata_params: Any
-) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    travelling_metadata: Dict[str, Any],
+    with_delta: bool = False,
+    **metadata_params: Any,
+) -> Union[
+    Tuple[Dict[str, Any], Dict[str, Any]],
+    Tuple[Dict[str, Any], Dict[str, Any], List[Dict[str, Any]]],
+]:
     """Updates en-route "travelling metadata" at the version level.
     Note that currently, only the description, labels and annotations
     can be changed. Other values are set automatically.
 
     Args:
         travelling_metadata
+        with_delta (optional) also return the delta (see create_delta)
         **metadata_params (optional keyword arguments)
 
     Returns:
         travelling metadata dict
         travelling json_schema
+        delta (if with_delta is set)
     """
     metadata = Metadata(**travelling_metadata)
+    _patch_travelling_metadata(metadata, **metadata_params)
+
+    if with_delta:
+        return (
+            metadata.to_dict(),
+            metadata.get_json_schema(),
+            create_delta(travelling_metadata, metadata.to_dict()),
+        )
+    return metadata.to_dict(), metadata.get_json_schema()
+
 
+def _patch_travelling_metadata(metadata: Metadata, **metadata_params: Any):
+    """Applies the changes made by patch_travelling_metadata() to metadata"""
     if 'description' in metadata_params:
         metadata.set_description(metadata_params['description'])
 
@@ -312,8 +665,6 @@ def patch_travelling_metadata(
     if 'annotations' in metadata_params:
         metadata.add_annotations(metadata_params['annotations'])
 
-    return metadata.to_dict(), metadata.get_json_schema()
-
 
 def post_travelling_metadata_to_existing_dataset(
     travelling_metadata: Dict[str, Any], dataset_metadata: Dict[str, Any], version: int
@@ -336,17 +687,20 @@ def post_travelling_metadata_to_existing_dataset(
     """
 
     t_metadata = Metadata(**travelling_metadata)
-    synchronised_datetime = t_metadata.get_synchronised_datetime()
 
+    # Only the labels applied since the travelling metadata was synchronised
+    # with the dataset are added to the dataset.
     d_metadata_params = {
-        'labels': copy.deepcopy(
-            t_metadata.get_labels_existing_dataset(synchronised_datetime)
-        )
+        'labels': [
+            label.to_dict()
+            for label in t_metadata.labels_since(t_metadata.synchronised_datetime)
+        ]
     }
     v_metadata_params = {
         'annotations': copy.deepcopy(travelling_metadata['annotations'])
     }
 
+    # pylint: disable=unbalanced-tuple-unpacking
     dataset_metadata, dataset_schema = patch_dataset_metadata(
         dataset_metadata, **d_metadata_params
     )
@@ -361,8 +715,11 @@ def post_travelling_metadata_to_existing_dataset(
 # Job Annotation Methods
 def _get_derived_metadata(
     project_directory: str, username: str, source_file: str = '', derived_from: str = ''
-) -> Dict[str, Any]:
-    """Return or create metadata for derived_from file."""
+) -> Metadata:
+    """Return or create metadata for derived_from file.
+    An existing meta.json file is read incrementally so that large travelling
+    metadata files are not loaded into memory in one go.
+    """
 
     if isinstance(source_file, str):
         # If the source_file is a string then check for it. We don't allow multiple input files
@@ -374,13 +731,13 @@ def _get_derived_metadata(
 
         if os.path.isfile(meta_path):
             with open(meta_path, 'rt', encoding='utf8') as meta_file:
-                return json.load(meta_file)
+                return read_metadata(meta_file)
 
-    # Create the dictionary with the remaining parameters
+    # Create the metadata with the remaining parameters
     metadata = Metadata(derived_from, 'None', 'Automatically created by job', username)
     metadata.set_synchronised_datetime()
 
-    return metadata.to_dict()
+    return metadata
 
 
 def _create_labels(output_spec: Dict[str, Any]) -> list:
@@ -518,7 +875,7 @@ def _get_params_filename(filepath: str) -> str:
 
 
 def _create_param_file(
-    results_metadata: Dict[str, Any], result_path: str, result_filename: str
+    metadata: Metadata, result_path: str, result_filename: str
 ) -> str:
     """Creates a parameter file if requested from the fields that were added in
     Service Execution annotation.
@@ -526,7 +883,6 @@ def _create_param_file(
     """
     params_filename = _get_params_filename(result_filename)
     params_path = os.path.join(result_path, params_filename)
-    metadata = Metadata(**results_metadata)
 
     result_params = {}
     for key, values in metadata.get_compiled_fields()['fields'].items():
@@ -534,7 +890,7 @@ def _create_param_file(
 
     with open(params_path, 'wt', encoding='utf8') as params_file:
         # Dump params of fields created
-        json.dump(result_params, params_file)
+        codec.dump(result_params, params_file)
 
     return params_path
 
@@ -610,14 +966,13 @@ def _create_annotations(
     basic_logger.info('se_annotation=%s', se_annotation)
 
     if se_annotation or new_labels:
-        results_metadata, results_schema = patch_travelling_metadata(
-            derived_metadata, annotations=se_annotation, labels=new_labels
+        results_metadata = derived_metadata
+        _patch_travelling_metadata(
+            results_metadata, annotations=se_annotation, labels=new_labels
         )
     else:
         return meta_files, param_files
 
-    basic_logger.info('results_metadata=%s', results_metadata)
-
     result_dir = os.path.dirname(output_spec['creates'])
     result_filename = os.path.basename(output_spec['creates'])
     results_metadata_filename, results_schema_filename = get_metadata_filenames(
@@ -634,12 +989,15 @@ def _create_annotations(
 
     with open(results_metadata_path, 'wt', encoding='utf8') as meta_file:
         # Dump metadata including the SE annotation
-        json.dump(results_metadata, meta_file)
+        results_metadata.write_json(meta_file)
         meta_files.append(results_metadata_path)
+    # Only the path is logged, as the metadata is streamed to the file rather
+    # than built as a whole dictionary or string.
+    basic_logger.info('results_metadata=%s', results_metadata_path)
 
     with open(results_schema_path, 'wt', encoding='utf8') as schema_file:
         # Dump metadata including the SE annotation
-        json.dump(results_schema, schema_file)
+        codec.dump(results_metadata.get_json_schema(), schema_file)
         meta_files.append(results_schema_path)
 
     if create_param_file:
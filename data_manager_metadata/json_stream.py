@@ -0,0 +1,174 @@
+"""Data Manager Metadata incremental JSON reader.
+
+    Reads metadata (.meta.json) and annotations (.annotations) files a chunk
+    at a time rather than loading the whole file with json.load. Annotations
+    files can be JSON arrays or JSON Lines.
+    - The top-level metadata items are parsed one at a time.
+    - Annotation and label dictionaries are returned one at a time, so
+    Metadata.from_items() can create each annotation as it is read.
+
+    Only the text of the annotation being parsed is held in memory, so large
+    travelling metadata files can be processed in bounded memory.
+"""
+import json
+import re
+from typing import Any, Iterator, Tuple
+
+from .metadata import Metadata
+
+# The default number of characters read from a file at a time.
+_CHUNK_SIZE: int = 65536
+
+_DECODER = json.JSONDecoder()
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+# The characters that can continue the text of a number.
+_NUMBER_CHARACTERS = frozenset('0123456789.eE+-')
+
+
+class _JSONStream:
+    """A JSON text file read a chunk at a time. Values are parsed with the
+    standard json decoder once the buffer holds all of their text.
+    """
+
+    def __init__(self, fp, chunk_size: int):
+        self._fp = fp
+        self._chunk_size = chunk_size
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+
+    def _read(self):
+        """Read more text into the buffer, dropping the text already parsed.
+        At least as much as is left in the buffer is read, so a value that
+        spans many chunks is not parsed again for every chunk.
+        """
+        if self._eof:
+            return
+        chunk = self._fp.read(max(self._chunk_size, len(self._buffer) - self._pos))
+        if chunk:
+            self._buffer = self._buffer[self._pos :] + chunk
+            self._pos = 0
+        else:
+            self._eof = True
+
+    def _error(self, message: str):
+        return json.JSONDecodeError(message, self._buffer, self._pos)
+
+    def peek(self) -> str:
+        """Returns the next character that is not whitespace ('' at the end
+        of the file) without consuming it.
+        """
+        while True:
+            self._pos = _WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer) or self._eof:
+                return self._buffer[self._pos : self._pos + 1]
+            self._read()
+
+    def expect(self, characters: str) -> str:
+        """Consume and return the next character, which must be one of the
+        given characters.
+        """
+        character = self.peek()
+        if not character or character not in characters:
+            raise self._error('Expecting one of %r' % characters)
+        self._pos += 1
+        return character
+
+    def value(self) -> Any:
+        """Parse and return the next value"""
+        self.peek()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self._buffer, self._pos)
+                # A number at the end of the buffer, or followed by a
+                # character that could continue it (e.g. the '.' of '1.5'
+                # split after the '.'), may continue in the file.
+                if (
+                    self._eof
+                    or isinstance(value, bool)
+                    or not isinstance(value, (int, float))
+                    or (
+                        end < len(self._buffer)
+                        and self._buffer[end] not in _NUMBER_CHARACTERS
+                    )
+                ):
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            self._read()
+
+    def iter_array(self) -> Iterator[Any]:
+        """Yield the values of the array at the current position"""
+        self.expect('[')
+        if self.peek() == ']':
+            self._pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.expect(',]') == ']':
+                return
+
+    def iter_object(self) -> Iterator[str]:
+        """Yield the keys of the object at the current position. The value of
+        each key must be consumed before the next key is requested.
+        """
+        self.expect('{')
+        if self.peek() == '}':
+            self._pos += 1
+            return
+        while True:
+            if self.peek() != '"':
+                raise self._error('Expecting property name enclosed in double quotes')
+            key = self.value()
+            self.expect(':')
+            yield key
+            if self.expect(',}') == '}':
+                return
+
+    def end(self):
+        """Check that there is nothing but whitespace left in the file"""
+        if self.peek():
+            raise self._error('Extra data')
+
+
+def iter_annotations(fp, chunk_size: int = _CHUNK_SIZE) -> Iterator[dict]:
+    """Yield the annotation dictionaries in an annotations file (or
+    file-like object) one at a time. This can be either:
+    - a JSON array of annotations (or a single annotation), or
+    - JSON Lines, with one annotation on each line, which can be appended to
+    without reading the file (see md_manage.py).
+    """
+    stream = _JSONStream(fp, chunk_size)
+    if stream.peek() == '[':
+        yield from stream.iter_array()
+        stream.end()
+        return
+    while stream.peek():
+        yield stream.value()
+
+
+def iter_metadata_items(fp, chunk_size: int = _CHUNK_SIZE) -> Iterator[Tuple[str, Any]]:
+    """Yield the (key, value) items of a metadata file one at a time.
+    The values of the annotations and labels are iterators of the annotation
+    dictionaries, which must be used before the next item is requested.
+    """
+    stream = _JSONStream(fp, chunk_size)
+    for key in stream.iter_object():
+        if key in ('annotations', 'labels') and stream.peek() == '[':
+            rows = stream.iter_array()
+            yield key, rows
+            # Skip any annotations that were not used.
+            for _ in rows:
+                pass
+        else:
+            yield key, stream.value()
+    stream.end()
+
+
+def read_metadata(fp, trusted: bool = False, chunk_size: int = _CHUNK_SIZE):
+    """Create Metadata from a metadata file, creating the annotations as
+    they are read (see Metadata.from_items).
+    """
+    return Metadata.from_items(iter_metadata_items(fp, chunk_size), trusted)
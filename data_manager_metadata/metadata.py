@@ -5,15 +5,17 @@
     The other classes should be searialisable without pickling hopefully:
     Hints: https://pynative.com/make-python-class-json-serializable/
 """
-import json
+import bisect
 import datetime
-import yaml
+import hashlib
+import sys
 import copy
 from typing import List
 from abc import ABC, abstractmethod
-import re
 
-from .exceptions import ANNOTATION_ERRORS, AnnotationValidationError
+from . import binary, codec
+from .exceptions import AnnotationValidationError
+from .validators import validate
 
 _METADATA_VERSION: str = '0.0.1'
 _ANNOTATION_VERSION: str = '0.0.1'
@@ -29,6 +31,26 @@ _ANNOTATIONS_EXT = '.annotations'
 # list that is indexed by the field name.
 FIELD_DICT = {'type': '', 'description': '', 'required': False, 'active': False}
 
+# Annotation types that contribute fields to the compiled fields descriptor.
+_FIELDS_ANNOTATION_TYPES = ['FieldsDescriptorAnnotation', 'ServiceExecutionAnnotation']
+
+# The origin and description of the FieldsDescriptorAnnotation that holds the
+# compiled fields of the annotations folded by Metadata.compact().
+_COMPACT_ORIGIN = 'Metadata.compact'
+_COMPACT_DESCRIPTION = 'Compiled fields of the compacted annotation history'
+
+# Annotation items whose values repeat across annotations and documents and
+# are interned when annotations are created from dictionaries.
+_INTERNED_ITEMS = [
+    'meta_property',
+    'origin',
+    'service',
+    'service_version',
+    'service_user',
+    'service_name',
+    'service_ref',
+]
+
 
 def get_metadata_version() -> str:
     return _METADATA_VERSION
@@ -46,12 +68,265 @@ def get_annotation_filename(filename: str) -> str:
     return filename + _ANNOTATIONS_EXT
 
 
+class FieldRecord:
+    """Class FieldRecord
+
+    Purpose: A row of the FieldsDescriptorAnnotation fields list. It holds the
+    same items as FIELD_DICT but without the overhead of a dict for every
+    field of every annotation.
+
+    """
+
+    __slots__ = ('type', 'description', 'required', 'active')
+
+    def __init__(
+        self,
+        prop_type: str = '',
+        description: str = '',
+        required: bool = False,
+        active: bool = False,
+    ):
+        self.type = prop_type
+        self.description = description
+        self.required = required
+        self.active = active
+
+    def to_dict(self):
+        """Return the row in the form of a FIELD_DICT dictionary"""
+        return {
+            'type': self.type,
+            'description': self.description,
+            'required': self.required,
+            'active': self.active,
+        }
+
+
+def _to_datetime(value) -> datetime.datetime:
+    """Return a datetime from either a datetime or an isoformat string"""
+    if isinstance(value, datetime.datetime):
+        return value
+    return datetime.datetime.fromisoformat(value)
+
+
+def _intern_string(value):
+    """Returns the interned copy of a string so that a process holds each
+    distinct value once. Anything else is returned as it is.
+    """
+    if type(value) is str:  # pylint: disable=unidiomatic-typecheck
+        return sys.intern(value)
+    return value
+
+
+# The function used to intern repeated annotation strings. This can be
+# replaced (for example by a function that returns the value as it is) to
+# measure or change the interning.
+_intern = _intern_string
+
+
+def _label_type(label: str) -> str:
+    """Returns the implicit type of a label: hash, address or plain"""
+    if label[0] == '#':
+        return 'hash'
+    if label[0] == '@':
+        return 'address'
+    return 'plain'
+
+
+# Annotations and labels are held in Metadata either as objects or, if they
+# were loaded from a trusted dictionary and have not been needed yet, as the
+# original dictionary. These functions return items from either form.
+def _entry_type(entry) -> str:
+    if isinstance(entry, dict):
+        return entry['type']
+    return entry.get_type()
+
+
+def _entry_created(entry) -> datetime.datetime:
+    if isinstance(entry, dict):
+        return datetime.datetime.fromisoformat(entry['created'])
+    return entry.created
+
+
+def _entry_dict(entry) -> dict:
+    if isinstance(entry, dict):
+        return entry
+    return entry.to_dict()
+
+
+def _entry_label(entry) -> str:
+    if isinstance(entry, dict):
+        return entry['label']
+    return entry.get_label()
+
+
+def _canonical_entry(annotation_dict: dict) -> dict:
+    """Returns an annotation dictionary with the created datetime in the
+    canonical format (isoformat() leaves out zero microseconds).
+    """
+    created = annotation_dict.get('created')
+    if isinstance(created, str) and len(created) == 19:
+        return {**annotation_dict, 'created': created + '.000000'}
+    return annotation_dict
+
+
+def _annotation_id(annotation_dict: dict) -> str:
+    """Returns the identity of an annotation, which is the SHA-256 digest of
+    the canonical JSON of its dictionary. Equal annotations (including their
+    created datetime) have the same identity wherever they came from.
+    """
+    text = codec.canonical_dumps(_canonical_entry(annotation_dict))
+    return hashlib.sha256(text.encode('utf-8', 'surrogatepass')).hexdigest()
+
+
+def _chain_digest(digest: str, entry) -> str:
+    """Returns the digest of a list of annotations (or labels) after an entry
+    is appended, from the digest of the list before. The digest of an empty
+    list is ''.
+    """
+    text = digest + _annotation_id(_entry_dict(entry))
+    return hashlib.sha256(text.encode('ascii')).hexdigest()
+
+
+def _compile_fields(compiled, annotation):
+    """Add the active fields of a FieldsDescriptor or ServiceExecution
+    annotation (or trusted annotation dictionary) to a FieldsDescriptor
+    compilation of the fields. Any other annotation is ignored.
+    """
+    if _entry_type(annotation) not in _FIELDS_ANNOTATION_TYPES:
+        return
+    if isinstance(annotation, dict):
+        # The active fields, as get_fields() would return them.
+        fields = {
+            prop: values
+            for prop, values in annotation['fields'].items()
+            if values['active']
+        }
+    else:
+        fields = annotation.get_fields()
+    # Allow for validation errors in old field descriptors.
+    try:
+        compiled.add_fields(fields)
+    except AnnotationValidationError:
+        pass
+
+
+def _checkpoint_matches(entries: List, count, entry_id) -> bool:
+    """Returns True if a checkpoint taken at a count of annotations (or
+    labels) matches a list, which is if the list has at least that many
+    entries and the last entry the checkpoint covers has the recorded
+    annotation identity.
+    """
+    # pylint: disable=unidiomatic-typecheck
+    if type(count) is not int or not 0 <= count <= len(entries):
+        return False
+    if count == 0:
+        return True
+    return _annotation_id(_entry_dict(entries[count - 1])) == entry_id
+
+
+def _write_json_list(fp, entries: List):
+    """Write a list of annotations as a JSON array, one annotation at a time"""
+    fp.write('[')
+    for pos, entry in enumerate(entries):
+        if pos:
+            fp.write(', ')
+        codec.dump(_entry_dict(entry), fp)
+    fp.write(']')
+
+
+def _created_index(entries: List):
+    """Returns the created datetimes of a list of annotations in created order
+    and a parallel list of the positions of the annotations in the list.
+    """
+    created = [_entry_created(entry) for entry in entries]
+    positions = sorted(range(len(entries)), key=created.__getitem__)
+    return [created[pos] for pos in positions], positions
+
+
+def _insert_by_created(created_list: List, pos_list: List, created, pos: int):
+    """Insert the position of an annotation into a list of positions held in
+    created order, keeping the parallel list of created datetimes in step.
+    Annotations are normally created in order so this is usually an append.
+    """
+    index = bisect.bisect_right(created_list, created)
+    created_list.insert(index, created)
+    pos_list.insert(index, pos)
+
+
+# The private items of Metadata that are memoised or built when they are first
+# needed, and are None until then. They are derived from the other items, so
+# they are not pickled.
+_METADATA_LAZY_ITEMS = (
+    '_dict',
+    '_json',
+    '_checkpoint',
+    '_compiled_fields',
+    '_annotation_times',
+    '_annotation_positions',
+    '_label_times',
+    '_label_positions',
+    '_annotation_ids',
+    '_latest_created',
+    '_annotations_digest',
+    '_labels_digest',
+    '_latest_labels',
+    '_latest_labels_by_type',
+)
+
+
+def _is_trusted_fields(fields) -> bool:
+    """Returns True if the fields of an annotation dictionary have the shape
+    of FIELD_DICT rows, with string types and descriptions and boolean
+    required and active flags.
+    """
+    if not isinstance(fields, dict):
+        return False
+    for values in fields.values():
+        if not (
+            isinstance(values, dict)
+            and isinstance(values.get('type'), str)
+            and isinstance(values.get('description'), str)
+            and isinstance(values.get('required'), bool)
+            and isinstance(values.get('active'), bool)
+        ):
+            return False
+    return True
+
+
+def _is_trusted_row(row: dict, class_lookup: dict) -> bool:
+    """Returns True if an annotation dictionary can be trusted, which is if it
+    has all the items of an annotation at the current annotation version and
+    its nested fields and service parameters have the right shape.
+    Otherwise it has to be created and validated as normal.
+
+    Note that the values themselves (label and field names, lengths, field
+    types, ...) are not validated, as trusted dictionaries are ones that were
+    validated before they were saved.
+    """
+    annotation_class = class_lookup.get(row.get('type'))
+    if (
+        annotation_class is None
+        or row.get('annotation_version') != _ANNOTATION_VERSION
+        or not row.keys() >= _ITEM_NAMES[annotation_class]
+    ):
+        return False
+    if 'fields' in row and not _is_trusted_fields(row['fields']):
+        return False
+    return 'service_parameters' not in row or isinstance(
+        row['service_parameters'], dict
+    )
+
+
 class Metadata:
     """Class Metadata
 
     Purpose: Defines a list of metadata dnd annotations that can be serialized
     and saved in a dataset.
 
+    The dictionary and JSON forms of the metadata are memoised until the
+    metadata is changed, so the metadata must only be changed through its
+    methods and annotations must not be changed once they are added.
+
     """
 
     def __init__(
@@ -67,11 +342,16 @@ class Metadata:
         labels: List = None,
         dataset_version: int = None,
         synchronised_datetime: str = None,
+        checkpoint: dict = None,
     ):
         assert dataset_name
         assert dataset_id
         assert created_by
 
+        # The memoised to_dict() and to_json() results (see _changed).
+        self._dict = None
+        self._json = None
+
         self.dataset_name = dataset_name
         self.dataset_uuid = dataset_id
         self.description = description
@@ -94,12 +374,55 @@ class Metadata:
         else:
             self.metadata_version = get_metadata_version()
 
-        self.annotations = []
+        # The compilation of all fields in the FieldsDescriptor and
+        # ServiceExecution annotations. This is built when it is first needed,
+        # starting from the checkpoint if there is a valid one (see to_dict),
+        # and then maintained as annotations are added so that the json schema
+        # does not need to replay the history.
+        self._checkpoint = checkpoint
+        self._compiled_fields = None
+
+        # The positions of the annotations and labels in created order, with a
+        # parallel list of the created datetimes, so that the annotations and
+        # labels created since a given datetime can be found with a bisect.
+        # These are built when they are first needed.
+        self._annotation_times = None
+        self._annotation_positions = None
+        self._label_times = None
+        self._label_positions = None
+
+        # The position of the first annotation with each annotation identity
+        # (see Annotation.get_id). This is built when it is first needed.
+        # A duplicate annotation has the same created datetime as the one it
+        # duplicates, so an annotation created after the latest created
+        # datetime is not a duplicate and the index is not needed for it.
+        # The latest created datetime is also found when it is first needed,
+        # from the checkpoint if there is a valid one.
+        self._annotation_ids = None
+        self._latest_created = None
+
+        # The digests of the annotations and labels lists for fingerprint().
+        # These are built when they are first needed and then updated as
+        # annotations and labels are appended.
+        self._annotations_digest = None
+        self._labels_digest = None
+
+        # Annotations loaded from a trusted dictionary are held as the
+        # dictionary until they are needed (see _get_annotation).
+        self._annotations = []
         if annotations:
             annos_copy = copy.deepcopy(annotations)
             self.add_annotations(annos_copy, init=True)
 
-        self.labels = []
+        # The position of the latest label annotation for each label in the
+        # order that the labels were last applied. The same labels are also
+        # bucketed by the label type (hash, address or plain) so they can be
+        # filtered quickly. Like the compiled fields, these are built when
+        # they are first needed (see _get_latest_labels).
+        self._latest_labels = None
+        self._latest_labels_by_type = None
+
+        self._labels = []
         if labels:
             labels_copy = copy.deepcopy(labels)
             for label_row in labels_copy:
@@ -119,6 +442,122 @@ class Metadata:
                 _DEFAULT_SYNC_TIME, '%Y-%m-%dT%H:%M:%S.%f'
             )
 
+    def __getstate__(self):
+        """Returns the state to pickle, without the memoised and lazily built
+        items, which are rebuilt when they are needed after loading.
+        """
+        return {
+            name: value
+            for name, value in self.__dict__.items()
+            if name not in _METADATA_LAZY_ITEMS
+        }
+
+    def __setstate__(self, state: dict):
+        """Restore pickled metadata. Metadata pickled before the annotations
+        and labels were held privately has them as 'annotations' and
+        'labels', and none of the lazily built items.
+        """
+        state = dict(state)
+        for name in ('annotations', 'labels'):
+            if name in state:
+                state['_' + name] = state.pop(name)
+        self.__dict__.update(dict.fromkeys(_METADATA_LAZY_ITEMS))
+        self.__dict__.update(state)
+
+    @classmethod
+    def from_trusted_dict(cls, metadata_dict: dict):
+        """Create metadata from a dictionary created by to_dict() that has
+        already been validated, for example metadata read back from the data
+        tier.
+
+        Annotations and labels at the current annotation version are not
+        re-validated or deep copied. They are kept as dictionaries and only
+        created when a method needs them, and to_dict() returns any that have
+        not been created as they are. So the dictionary must not be changed
+        while the metadata is in use.
+        Metadata or annotations at any other version are created and
+        validated as normal.
+        """
+        if metadata_dict.get('metadata_version') != _METADATA_VERSION:
+            return cls(**metadata_dict)
+
+        params = {
+            key: value
+            for key, value in metadata_dict.items()
+            if key not in ['annotations', 'labels']
+        }
+        metadata = cls(**params)
+
+        annotations = metadata_dict.get('annotations') or []
+        if 'type' in annotations:
+            # Only one annotation in the dict.
+            annotations = [annotations]
+        for annotation_row in annotations:
+            if _is_trusted_row(annotation_row, _ANNOTATION_CLASSES):
+                metadata._append_annotation(annotation_row)
+            else:
+                metadata._create_annotation(copy.deepcopy(annotation_row))
+
+        for label_row in metadata_dict.get('labels') or []:
+            if _is_trusted_row(label_row, _LABEL_CLASSES):
+                metadata._append_label(label_row)
+            else:
+                metadata._create_label(copy.deepcopy(label_row))
+
+        return metadata
+
+    @classmethod
+    def from_items(cls, items, trusted: bool = False):
+        """Create metadata from (key, value) items in the form of to_dict(),
+        where the annotations and labels can be any iterable of annotation
+        dictionaries (see json_stream.read_metadata). Each annotation is
+        created as it arrives so the dictionaries are not all held at once.
+
+        The dictionaries are not copied. If trusted is True they are loaded
+        as from_trusted_dict() loads them, otherwise they are validated.
+        The annotations and labels must follow the dataset_name, dataset_id,
+        description and created_by items, as they do in to_dict().
+        """
+        # pylint: disable=protected-access
+        params = {}
+        metadata = None
+        late_params = False
+        for key, value in items:
+            if key not in ['annotations', 'labels']:
+                params[key] = value
+                late_params = late_params or metadata is not None
+                continue
+
+            if metadata is None:
+                metadata = cls(**params)
+                trusted = trusted and metadata.metadata_version == _METADATA_VERSION
+            if isinstance(value, dict):
+                # Only one annotation in the dict.
+                value = [value]
+            for row in value or []:
+                if key == 'annotations':
+                    if trusted and _is_trusted_row(row, _ANNOTATION_CLASSES):
+                        metadata._append_annotation(row)
+                    else:
+                        metadata._create_annotation(row)
+                elif trusted and _is_trusted_row(row, _LABEL_CLASSES):
+                    metadata._append_label(row)
+                else:
+                    metadata._create_label(row)
+
+        if metadata is None:
+            return cls(**params)
+        if late_params:
+            # Items after the annotations and labels (synchronised_datetime
+            # in to_dict order) are taken from metadata created without them.
+            for name, value in vars(cls(**params)).items():
+                if not name.startswith('_'):
+                    setattr(metadata, name, value)
+            metadata._checkpoint = params.get('checkpoint')
+            metadata._changed()
+
+        return metadata
+
     def get_dataset_name(self):
         return self.dataset_name
 
@@ -127,6 +566,7 @@ class Metadata:
         annotation = PropertyChangeAnnotation('dataset_name', self.dataset_name)
         self.add_annotation(annotation)
         self.dataset_name = dataset_name
+        self._changed()
 
     def get_dataset_uuid(self):
         return self.dataset_uuid
@@ -136,6 +576,7 @@ class Metadata:
         annotation = PropertyChangeAnnotation('dataset_uuid', self.dataset_uuid)
         self.add_annotation(annotation)
         self.dataset_uuid = dataset_uuid
+        self._changed()
 
     def get_description(self):
         return self.description
@@ -144,6 +585,7 @@ class Metadata:
         annotation = PropertyChangeAnnotation('description', self.description)
         self.add_annotation(annotation)
         self.description = description
+        self._changed()
 
     def get_created_by(self):
         return self.created_by
@@ -153,6 +595,7 @@ class Metadata:
         annotation = PropertyChangeAnnotation('created_by', self.created_by)
         self.add_annotation(annotation)
         self.created_by = created_by
+        self._changed()
 
     def get_metadata_version(self):
         return self.metadata_version
@@ -165,6 +608,7 @@ class Metadata:
         # a technical field.
         assert dataset_version
         self.dataset_version = dataset_version
+        self._changed()
 
     def get_synchronised_datetime(self):
         return self.synchronised_datetime.isoformat()
@@ -173,16 +617,190 @@ class Metadata:
         # Note that no property change annotation is set here as this is
         # a technical field.
         self.synchronised_datetime = datetime.datetime.utcnow()
+        self._changed()
+
+    def _changed(self):
+        """Discard the memoised dictionary and JSON after a change"""
+        self._dict = None
+        self._json = None
+
+    @property
+    def annotations(self) -> List:
+        """The list of annotation objects"""
+        for pos in range(len(self._annotations)):
+            self._get_annotation(pos)
+        return self._annotations
+
+    @property
+    def labels(self) -> List:
+        """The list of label annotation objects"""
+        for pos in range(len(self._labels)):
+            self._get_label(pos)
+        return self._labels
+
+    def _get_annotation(self, pos: int):
+        """Get an annotation object from the annotation list, creating it from
+        its trusted dictionary if that has not already been done.
+        """
+        annotation = self._annotations[pos]
+        if isinstance(annotation, dict):
+            annotation_class = _ANNOTATION_CLASSES[annotation['type']]
+            annotation = annotation_class.from_trusted_dict(annotation)
+            self._annotations[pos] = annotation
+        return annotation
+
+    def _get_label(self, pos: int):
+        """Get a label object from the labels list, creating it from its
+        trusted dictionary if that has not already been done.
+        """
+        label = self._labels[pos]
+        if isinstance(label, dict):
+            label = _LABEL_CLASSES[label['type']].from_trusted_dict(label)
+            self._labels[pos] = label
+        return label
 
     def get_annotation(self, pos: int):
         """Get an annotation from the annotation list identified by the
         position.
         """
-        return self.annotations[pos]
+        return self._get_annotation(pos)
+
+    def annotations_since(self, since) -> List:
+        """Get the annotations created after a given datetime (or isoformat
+        string) in created order.
+        """
+        if self._annotation_times is None:
+            self._annotation_times, self._annotation_positions = _created_index(
+                self._annotations
+            )
+        start = bisect.bisect_right(self._annotation_times, _to_datetime(since))
+        return [self._get_annotation(pos) for pos in self._annotation_positions[start:]]
+
+    def labels_since(self, since) -> List:
+        """Get the label annotations created after a given datetime (or
+        isoformat string) in the order they were added. This is the order
+        get_labels() uses to find the latest of each label, so labels with
+        the same created time, or added out of created order, are returned
+        in the order they apply.
+        """
+        if self._label_times is None:
+            self._label_times, self._label_positions = _created_index(self._labels)
+        start = bisect.bisect_right(self._label_times, _to_datetime(since))
+        return [self._get_label(pos) for pos in sorted(self._label_positions[start:])]
+
+    def _annotation_id_index(self) -> dict:
+        """Returns the position of the first annotation with each annotation
+        identity, building the index if it has not been needed before.
+        """
+        if self._annotation_ids is None:
+            self._annotation_ids = {}
+            for pos, entry in enumerate(self._annotations):
+                self._annotation_ids.setdefault(_annotation_id(_entry_dict(entry)), pos)
+        return self._annotation_ids
+
+    def _get_latest_created(self) -> datetime.datetime:
+        """Returns the latest created datetime of the annotations (datetime.min
+        if there are none), finding it if it has not been needed before. If
+        there is a valid checkpoint only the annotations after it are read.
+        """
+        if self._latest_created is None:
+            latest = datetime.datetime.min
+            start = 0
+            checkpoint = self._checkpoint
+            if checkpoint and _checkpoint_matches(
+                self._annotations,
+                checkpoint.get('annotation_count'),
+                checkpoint.get('annotation_id'),
+            ):
+                try:
+                    if checkpoint['annotation_count']:
+                        latest = _to_datetime(checkpoint['annotation_created'])
+                    start = checkpoint['annotation_count']
+                except (KeyError, TypeError, ValueError):
+                    latest = datetime.datetime.min
+            for pos in range(start, len(self._annotations)):
+                latest = max(latest, _entry_created(self._annotations[pos]))
+            self._latest_created = latest
+        return self._latest_created
+
+    def get_annotation_by_id(self, annotation_id: str):
+        """Get the annotation with an annotation identity (see
+        Annotation.get_id), or None if there is no such annotation.
+        """
+        pos = self._annotation_id_index().get(annotation_id)
+        if pos is None:
+            return None
+        return self._get_annotation(pos)
+
+    def _get_compiled_fields(self):
+        """Returns the compilation of the fields of the FieldsDescriptor and
+        ServiceExecution annotations, building it if it has not been needed
+        before. If there is a valid checkpoint only the annotations after it
+        are replayed. Annotations are processed in the order that they are
+        added to the annotations list.
+        """
+        if self._compiled_fields is None:
+            compiled = FieldsDescriptorAnnotation()
+            start = 0
+            checkpoint = self._checkpoint
+            if checkpoint and _checkpoint_matches(
+                self._annotations,
+                checkpoint.get('annotation_count'),
+                checkpoint.get('annotation_id'),
+            ):
+                # The fields are a list of [name, values] pairs, as the order
+                # of the fields (e.g. in the schema required list) would be
+                # lost if a store reordered the keys of an object.
+                try:
+                    if not isinstance(checkpoint['fields'], list):
+                        raise TypeError('The checkpoint fields are not a list')
+                    compiled.add_fields(
+                        {prop: dict(values) for prop, values in checkpoint['fields']}
+                    )
+                    start = checkpoint['annotation_count']
+                except (
+                    AnnotationValidationError,
+                    AttributeError,
+                    KeyError,
+                    TypeError,
+                    ValueError,
+                ):
+                    compiled = FieldsDescriptorAnnotation()
+            for pos in range(start, len(self._annotations)):
+                _compile_fields(compiled, self._annotations[pos])
+            self._compiled_fields = compiled
+        return self._compiled_fields
+
+    def _append_annotation(self, annotation):
+        """Append an annotation (or trusted annotation dictionary) to the
+        annotations list and the indexes.
+        """
+        self._changed()
+        pos = len(self._annotations)
+        self._annotations.append(annotation)
+        if self._compiled_fields is not None:
+            _compile_fields(self._compiled_fields, annotation)
+        if self._annotation_times is not None:
+            _insert_by_created(
+                self._annotation_times,
+                self._annotation_positions,
+                _entry_created(annotation),
+                pos,
+            )
+        if self._annotation_ids is not None:
+            self._annotation_ids.setdefault(
+                _annotation_id(_entry_dict(annotation)), pos
+            )
+        if self._latest_created is not None:
+            self._latest_created = max(self._latest_created, _entry_created(annotation))
+        if self._annotations_digest is not None:
+            self._annotations_digest = _chain_digest(
+                self._annotations_digest, annotation
+            )
 
     def add_annotation(self, annotation: object):
         """Add a serialized annotation to the annotation list"""
-        self.annotations.append(annotation)
+        self._append_annotation(annotation)
         self.last_updated = datetime.datetime.utcnow()
 
     def get_annotations_dict(self, annotation_type=all):
@@ -194,28 +812,27 @@ class Metadata:
             filter within a particular class.
         """
         anno_list = []
-        for anno in self.annotations:
+        for anno in self._annotations:
             if annotation_type is all:
-                anno_list.append(anno.to_dict())
-            elif anno.get_type() is annotation_type:
-                anno_list.append(anno.to_dict())
+                anno_list.append(_entry_dict(anno))
+            elif _entry_type(anno) == annotation_type:
+                anno_list.append(_entry_dict(anno))
         return anno_list
 
     def get_annotations_json(self, annotation_type=all):
         """Get a list of all annotations from the annotation list in json
         format.
         """
-        return json.dumps(self.get_annotations_dict(annotation_type))
+        return codec.dumps(self.get_annotations_dict(annotation_type))
 
-    def _create_annotation(self, annotation_row: dict):
+    def _create_annotation(self, annotation_row: dict, skip_duplicate=False) -> bool:
         """Creates an annotation object based on the dictionary and add to the
-        annotations list.
+        annotations list. If skip_duplicate is True the annotation is not added
+        if an equal annotation is already in the list.
+        Returns True if the annotation was added.
         """
-        class_lookup = {
-            'PropertyChangeAnnotation': PropertyChangeAnnotation,
-            'FieldsDescriptorAnnotation': FieldsDescriptorAnnotation,
-            'ServiceExecutionAnnotation': ServiceExecutionAnnotation,
-        }
+        # Work on a copy so that the dictionary itself is not changed.
+        annotation_row = dict(annotation_row)
 
         # Get class and original create data
         annotation_class = annotation_row['type']
@@ -229,17 +846,33 @@ class Metadata:
             del annotation_row['created']
         if 'annotation_version' in annotation_row:
             del annotation_row['annotation_version']
+        for item in _INTERNED_ITEMS:
+            if item in annotation_row:
+                annotation_row[item] = _intern(annotation_row[item])
 
         # Create new annotation for metadata using rest of original parameters
         # and reset created datetime. This also effectively validates the
         # content.
-        annotation = class_lookup[annotation_class](**annotation_row)
+        annotation = _ANNOTATION_CLASSES[annotation_class](**annotation_row)
         if annotation_created:
             annotation.set_created(annotation_created)
-        self.annotations.append(annotation)
+        if (
+            skip_duplicate
+            and annotation.created <= self._get_latest_created()
+            and annotation.get_id() in self._annotation_id_index()
+        ):
+            return False
+        self._append_annotation(annotation)
+        return True
 
     def add_annotations(self, annotations_list: dict, init=False):
-        """Add a list of annotations in json format to the annotation list"""
+        """Add a list of annotations in json format to the annotation list.
+
+        Annotations that are already in the list (with the same annotation
+        identity) are skipped, so adding the annotations of a copy of the
+        metadata again does not duplicate them. When the metadata is first
+        created (init) the annotations are all kept as they are.
+        """
         # Note that this also validates the Json and returns a ValueError if
         # not valid
         # annotations_list = json.loads(annotations)
@@ -250,22 +883,23 @@ class Metadata:
         #    annotations_list = []
         #    annotations_list.append(json.loads(annotations))
 
-        if 'type' in annotations_list:
+        if isinstance(annotations_list, dict):
             # Only one annotation in the dict.
-            self._create_annotation(annotations_list)
-        else:
-            # Murltiple annotations in the dict
-            for annotation_row in annotations_list:
-                self._create_annotation(annotation_row)
+            annotations_list = [annotations_list]
+        # Murltiple annotations in the dict
+        added = False
+        for annotation_row in annotations_list:
+            added = self._create_annotation(annotation_row, not init) or added
 
-        if not init:
+        if added and not init:
             self.last_updated = datetime.datetime.utcnow()
 
     def _create_label(self, label_row: dict):
         """Creates an annotation object based on the dictionary and add to the
         labels list.
         """
-        class_lookup = {'LabelAnnotation': LabelAnnotation}
+        # Work on a copy so that the dictionary itself is not changed.
+        label_row = dict(label_row)
 
         # Get class and original create data
         label_class = label_row['type']
@@ -283,14 +917,79 @@ class Metadata:
         # Create new label for metadata using rest of original parameters
         # and reset created datetime. This also effectively validates the
         # content.
-        label = class_lookup[label_class](**label_row)
+        label = _LABEL_CLASSES[label_class](**label_row)
         if label_created:
             label.set_created(label_created)
-        self.labels.append(label)
+        self._append_label(label)
+
+    def _append_label(self, label):
+        """Append a label (or trusted label dictionary) to the labels list and
+        the indexes.
+        """
+        self._changed()
+        pos = len(self._labels)
+        self._labels.append(label)
+        if self._latest_labels is not None:
+            self._index_label(_entry_label(label), pos)
+        if self._labels_digest is not None:
+            self._labels_digest = _chain_digest(self._labels_digest, label)
+        if self._label_times is not None:
+            _insert_by_created(
+                self._label_times, self._label_positions, _entry_created(label), pos
+            )
+
+    def _get_latest_labels(self, label_type: str = 'all') -> dict:
+        """Returns the index of the latest label annotation for each label
+        (of a label type), building the indexes if they have not been needed
+        before. If there is a valid checkpoint only the labels after it are
+        replayed.
+        """
+        if self._latest_labels is None:
+            self._latest_labels = {}
+            self._latest_labels_by_type = {'hash': {}, 'address': {}, 'plain': {}}
+            start = 0
+            checkpoint = self._checkpoint
+            if checkpoint and _checkpoint_matches(
+                self._labels, checkpoint.get('label_count'), checkpoint.get('label_id')
+            ):
+                start = checkpoint['label_count']
+                latest_labels = checkpoint.get('latest_labels')
+                # pylint: disable=unidiomatic-typecheck
+                if not isinstance(latest_labels, dict) or not all(
+                    type(pos) is int and 0 <= pos < start
+                    for pos in latest_labels.values()
+                ):
+                    start = 0
+                    latest_labels = {}
+                # The index is in the order the labels were last applied, so
+                # the labels are indexed in position order whatever the order
+                # of the keys of the stored checkpoint.
+                for label_name, pos in sorted(
+                    latest_labels.items(), key=lambda item: item[1]
+                ):
+                    self._index_label(_intern(label_name), pos)
+            for pos in range(start, len(self._labels)):
+                self._index_label(_entry_label(self._labels[pos]), pos)
+
+        if label_type == 'all':
+            return self._latest_labels
+        return self._latest_labels_by_type[label_type]
+
+    def _index_label(self, label_name: str, pos: int):
+        """Record the label at a position as the latest version of that label.
+        The label is moved to the end of the index so the index stays in the
+        order that the labels were last applied.
+        """
+        for index in (
+            self._latest_labels,
+            self._latest_labels_by_type[_label_type(label_name)],
+        ):
+            index.pop(label_name, None)
+            index[label_name] = pos
 
     def add_label(self, label: object):
         """Add a serialized annotation to the annotation list"""
-        self.labels.append(label)
+        self._append_label(label)
         self.last_updated = datetime.datetime.utcnow()
 
     def add_labels(self, labels_list: dict):
@@ -304,13 +1003,7 @@ class Metadata:
         after a given datetime (used for synchronising travelling metadata with
         an existing dataset when adding labels
         """
-        compare_datetime = datetime.datetime.strptime(
-            synchronised_datetime, '%Y-%m-%dT%H:%M:%S.%f'
-        )
-
-        return [
-            label.to_dict() for label in self.labels if label.created > compare_datetime
-        ]
+        return [label.to_dict() for label in self.labels_since(synchronised_datetime)]
 
     def get_labels_new_dataset(self, synchronised_datetime: str):
         """Get the subset of the labels from the from travelling metadat that with
@@ -319,15 +1012,17 @@ class Metadata:
         2. any hash or address labels.
         """
 
-        active_labels = self.get_labels(active=True)
-        for label in active_labels:
-            if (
-                label['label'][0] not in ['#', '@']
-                and label['created'] < synchronised_datetime
+        compare_datetime = _to_datetime(synchronised_datetime)
+
+        new_labels = []
+        for pos in reversed(self._get_latest_labels().values()):
+            label = self._get_label(pos)
+            if label.get_active() and (
+                label.get_label_type() != 'plain' or label.created >= compare_datetime
             ):
-                active_labels.remove(label)
+                new_labels.append(label.to_dict())
 
-        return active_labels
+        return new_labels
 
     def get_labels(self, active=None, labels_only=False, label_type='all'):
         """Returns a list of the active/inactive Label Annotations.
@@ -336,20 +1031,16 @@ class Metadata:
         active = true - filter for active
         If label_type is set, then filter for plain, hash(#) or address(@) labels
         """
+        latest_labels = self._get_latest_labels(label_type)
+
+        # The index holds the latest version of each label, so read through it
+        # in reverse order to return the most recently applied labels first.
+        # If active is set then any inactive labels are filtered out.
         label_list = []
-        label_set = set()
-        # Read through labels in reverse order and take the latest one for
-        # each label.
-        for anno in reversed(self.labels):
-            if anno.get_label(label_types=[label_type]) not in label_set:
-                label_list.append(anno)
-                label_set.add(anno.get_label())
-
-        # If not active then filter any inactive labels
-        if active is True:
-            for label in reversed(label_list):
-                if label.get_active() is False:
-                    label_list.remove(label)
+        for pos in reversed(latest_labels.values()):
+            label = self._get_label(pos)
+            if active is not True or label.get_active():
+                label_list.append(label)
 
         if labels_only:
             return_dict = {}
@@ -365,28 +1056,17 @@ class Metadata:
         of the json schema as defined in https://json-schema.org/.
         """
 
-        # Process all FieldDescriptor Annotations in the Annotations list in
-        # order to retrieve all of the fields in the dataset. Add these to a
-        # single new FieldDescriptor that will have compilation of all fields.
-        # We can then extract the active fields from the final compiled
-        # FieldDescriptor to use in the json schema output.
-        comp_descriptor = FieldsDescriptorAnnotation()
-        for annotation in self.annotations:
-            if annotation.get_type() in [
-                'FieldsDescriptorAnnotation',
-                'ServiceExecutionAnnotation',
-            ]:
-                # Allow for validation errors in old field descriptors.
-                try:
-                    comp_descriptor.add_fields(annotation.get_fields())
-                except AnnotationValidationError:
-                    pass
+        # The compiled fields contain the fields from all FieldDescriptor
+        # annotations in the annotations list. We can then extract the active
+        # fields to use in the json schema output.
         fields = {}
         required = []
 
-        for prop, value in comp_descriptor.get_fields(False).items():
-            fields[prop] = {'type': value['type'], 'description': value['description']}
-            if value['required']:
+        for prop, record in self._get_compiled_fields().fields.items():
+            if not record.active:
+                continue
+            fields[prop] = {'type': record.type, 'description': record.description}
+            if record.required:
                 required.append(prop)
 
         schema = {
@@ -408,26 +1088,148 @@ class Metadata:
         schema as defined in https://json-schema.org/.
         """
 
-        # Process all FieldDescriptor Annotations in the Annotations list in
-        # order to retrieve all of the fields in the dataset. Add these to a
-        # single new FieldDescriptor that will have compilation of all fields.
-
+        # Return the compiled fields from a new FieldDescriptor. The
+        # dictionary is a copy so the caller cannot change the compiled fields.
         comp_descriptor = FieldsDescriptorAnnotation()
-        for annotation in self.annotations:
-            if annotation.get_type() in [
-                'FieldsDescriptorAnnotation',
-                'ServiceExecutionAnnotation',
-            ]:
-                # Allow for validation errors in old field descriptors.
-                try:
-                    comp_descriptor.add_fields(annotation.get_fields())
-                except AnnotationValidationError:
-                    pass
+        # The fields are only read when the dictionary is created.
+        comp_descriptor.fields = self._get_compiled_fields().fields
 
         return comp_descriptor.to_dict()
 
-    def to_dict(self):
-        """Return principle data items in the form of a dictionary"""
+    def compact(self, since=None) -> dict:
+        """Fold the annotation and label history created up to a given
+        datetime (or isoformat string), or all of it if since is not given,
+        so that the metadata is smaller and quicker to process.
+
+        - The leading annotations created up to since are replaced by one
+        FieldsDescriptorAnnotation holding the fields compiled from them.
+        - The labels created up to since that have been superseded by a later
+        version of the same label are removed.
+        The annotations and labels created after since are kept as they are,
+        and get_json_schema(), get_compiled_fields() and get_labels() return
+        the same results as before.
+
+        Returns the archive of the annotations and labels that were removed,
+        as a dictionary of the 'annotations' and 'labels' lists in to_dict()
+        form, which can be stored separately to keep the full audit trail.
+        """
+        if since is not None:
+            since = _to_datetime(since)
+
+        # Annotations are folded in order up to the first that is kept, so
+        # the fields compile in the same order as before.
+        tail_start = len(self._annotations)
+        if since is not None:
+            for pos, entry in enumerate(self._annotations):
+                if _entry_created(entry) > since:
+                    tail_start = pos
+                    break
+        if tail_start == 1 and _entry_type(self._annotations[0]) == (
+            'FieldsDescriptorAnnotation'
+        ):
+            # Already compacted: a single FieldsDescriptor is its own snapshot.
+            tail_start = 0
+        folded = self._annotations[:tail_start]
+
+        latest_positions = set(self._get_latest_labels().values())
+        kept_labels = []
+        archive = {
+            'annotations': [_entry_dict(entry) for entry in folded],
+            'labels': [],
+        }
+        for pos, entry in enumerate(self._labels):
+            if pos in latest_positions or (
+                since is not None and _entry_created(entry) > since
+            ):
+                kept_labels.append(entry)
+            else:
+                archive['labels'].append(_entry_dict(entry))
+
+        if not folded and not archive['labels']:
+            return archive
+
+        annotations = self._annotations[tail_start:]
+        folded_fields = [
+            entry for entry in folded if _entry_type(entry) in _FIELDS_ANNOTATION_TYPES
+        ]
+        if folded_fields:
+            snapshot = FieldsDescriptorAnnotation(_COMPACT_ORIGIN, _COMPACT_DESCRIPTION)
+            for entry in folded_fields:
+                _compile_fields(snapshot, entry)
+            snapshot.created = max(_entry_created(entry) for entry in folded_fields)
+            annotations.insert(0, snapshot)
+
+        # Rebuild the lists, the compiled fields and the indexes. Any
+        # checkpoint no longer matches the lists.
+        self._checkpoint = None
+        self._compiled_fields = None
+        self._annotation_times = None
+        self._annotation_positions = None
+        self._label_times = None
+        self._label_positions = None
+        self._annotation_ids = None
+        self._latest_created = None
+        self._annotations_digest = None
+        self._labels_digest = None
+        self._latest_labels = None
+        self._latest_labels_by_type = None
+        self._annotations = []
+        self._labels = []
+        for entry in annotations:
+            self._append_annotation(entry)
+        for entry in kept_labels:
+            self._append_label(entry)
+
+        self.last_updated = datetime.datetime.utcnow()
+        return archive
+
+    def to_dict(self, checkpoint: bool = False):
+        """Return principle data items in the form of a dictionary.
+        The dictionary is memoised so it must not be changed.
+
+        If checkpoint is True the dictionary also has a checkpoint of the
+        compiled fields and the latest labels, so that when it is loaded they
+        are built from the checkpoint rather than by replaying every
+        annotation and label.
+        """
+        if self._dict is None:
+            self._dict = self._to_dict()
+        if checkpoint:
+            return {**self._dict, 'checkpoint': self._checkpoint_dict()}
+        return self._dict
+
+    def _checkpoint_dict(self) -> dict:
+        """Return a checkpoint of the compiled fields, the latest labels and
+        the latest annotation created datetime at the current number of
+        annotations and labels. The identity of the last
+        annotation and label is recorded so that a checkpoint that no longer
+        matches the lists is ignored.
+        """
+        annotation_id = None
+        annotation_created = None
+        if self._annotations:
+            annotation_id = _annotation_id(_entry_dict(self._annotations[-1]))
+            annotation_created = self._get_latest_created().isoformat()
+        label_id = None
+        if self._labels:
+            label_id = _annotation_id(_entry_dict(self._labels[-1]))
+        return {
+            'annotation_count': len(self._annotations),
+            'annotation_created': annotation_created,
+            'annotation_id': annotation_id,
+            'fields': [
+                [prop, values]
+                for prop, values in self._get_compiled_fields().get_fields(True).items()
+            ],
+            'label_count': len(self._labels),
+            'label_id': label_id,
+            'latest_labels': dict(self._get_latest_labels()),
+        }
+
+    def _items(self):
+        """Return the principle data items in to_dict() order with the
+        annotations and labels as they are held in the metadata.
+        """
         return {
             "dataset_name": self.dataset_name,
             "dataset_id": self.dataset_uuid,
@@ -437,15 +1239,106 @@ class Metadata:
             "created_by": self.created_by,
             "metadata_version": self.metadata_version,
             "dataset_version": self.dataset_version,
-            "annotations": [anno.to_dict() for anno in self.annotations],
-            "labels": [anno.to_dict() for anno in self.labels],
+            "annotations": self._annotations,
+            "labels": self._labels,
             "synchronised_datetime": self.synchronised_datetime.isoformat(),
         }
 
-    def to_json(self):
-        """Serialize class to JSON"""
-        output_dict = self.to_dict()
-        return json.dumps(output_dict)
+    def _to_dict(self):
+        output_dict = self._items()
+        output_dict["annotations"] = [_entry_dict(anno) for anno in self._annotations]
+        output_dict["labels"] = [_entry_dict(anno) for anno in self._labels]
+        return output_dict
+
+    def to_json(self, checkpoint: bool = False):
+        """Serialize class to JSON, with a checkpoint if checkpoint is True
+        (see to_dict).
+        """
+        if checkpoint:
+            return codec.dumps(self.to_dict(checkpoint=True))
+        if self._json is None:
+            self._json = codec.dumps(self.to_dict())
+        return self._json
+
+    def _canonical_items(self):
+        """Return the principle data items with the datetimes as datetime
+        objects, so that they are in the canonical format when encoded.
+        """
+        items = self._items()
+        items["created"] = self.created
+        items["last_updated"] = self.last_updated
+        items["synchronised_datetime"] = self.synchronised_datetime
+        return items
+
+    def to_canonical_json(self):
+        """Serialize class to canonical JSON: with sorted keys, no whitespace
+        and every datetime with microseconds (see codec.canonical_dumps).
+        Metadata with the same content always has the same canonical JSON.
+        """
+        items = self._canonical_items()
+        items["annotations"] = [
+            _canonical_entry(_entry_dict(anno)) for anno in self._annotations
+        ]
+        items["labels"] = [_canonical_entry(_entry_dict(anno)) for anno in self._labels]
+        return codec.canonical_dumps(items)
+
+    def fingerprint(self) -> str:
+        """Return a digest of the canonical form of the metadata that changes
+        whenever the metadata changes, for example for use as an ETag.
+
+        The annotations and labels are represented by digests that are
+        updated as they are appended, so after the first call this does not
+        depend on the number of annotations and labels.
+        """
+        if self._annotations_digest is None:
+            digest = ''
+            for anno in self._annotations:
+                digest = _chain_digest(digest, anno)
+            self._annotations_digest = digest
+        if self._labels_digest is None:
+            digest = ''
+            for label in self._labels:
+                digest = _chain_digest(digest, label)
+            self._labels_digest = digest
+
+        items = self._canonical_items()
+        items["annotations"] = self._annotations_digest
+        items["labels"] = self._labels_digest
+        text = codec.canonical_dumps(items)
+        return hashlib.sha256(text.encode('utf-8', 'surrogatepass')).hexdigest()
+
+    def to_bytes(self) -> bytes:
+        """Serialize class to the compact binary format (see binary.py)"""
+        return binary.dict_to_bytes(self.to_dict())
+
+    @classmethod
+    def from_bytes(cls, data: bytes):
+        """Create metadata from the binary format returned by to_bytes().
+        This is loaded as trusted metadata (see from_trusted_dict).
+        """
+        return cls.from_trusted_dict(binary.dict_from_bytes(data))
+
+    def write_json(self, fp, checkpoint: bool = False):
+        """Serialize class to JSON in a text file (or file-like object).
+        The annotations and labels are written one at a time rather than
+        building the whole document in memory first. The output is the same
+        as to_json(checkpoint).
+        """
+        if self._json is not None and not checkpoint:
+            fp.write(self._json)
+            return
+
+        separator = '{'
+        for key, value in self._items().items():
+            fp.write(separator + codec.dumps(key) + ': ')
+            separator = ', '
+            if key in ('annotations', 'labels'):
+                _write_json_list(fp, value)
+            else:
+                fp.write(codec.dumps(value))
+        if checkpoint:
+            fp.write(', "checkpoint": ' + codec.dumps(self._checkpoint_dict()))
+        fp.write('}')
 
 
 class Annotation(ABC):
@@ -455,12 +1348,63 @@ class Annotation(ABC):
     Purpose: Annotations can be added to Metadata. They are defined as classes
     so that they can have both fixed data and methods that work with the data.
 
+    Annotations define __slots__ rather than having an instance __dict__ as
+    large metadata documents can hold many thousands of them.
+
+    The dictionary form of an annotation is memoised. Methods that change an
+    annotation discard it and subclasses return their items from _to_dict().
+
     """
 
+    __slots__ = ('created', 'annotation_version', '_dict')
+
     @abstractmethod
     def __init__(self):
         self.created = datetime.datetime.utcnow()
         self.annotation_version = get_annotation_version()
+        self._dict = None
+
+    @classmethod
+    def from_trusted_dict(cls, annotation_dict: dict):
+        """Create an annotation from a dictionary created by to_dict() without
+        validating it (see Metadata.from_trusted_dict).
+        """
+        annotation = cls.__new__(cls)
+        annotation.created = datetime.datetime.fromisoformat(annotation_dict['created'])
+        annotation.annotation_version = annotation_dict['annotation_version']
+        # annotation is an instance of cls that __init__ has not been run on,
+        # so its private items are set here.
+        annotation._dict = None  # pylint: disable=protected-access
+        annotation._set_items(annotation_dict)  # pylint: disable=protected-access
+        return annotation
+
+    def _set_items(self, annotation_dict: dict):
+        """Set the items specific to the annotation class from a dictionary
+        created by to_dict().
+        """
+
+    def __getstate__(self):
+        """Returns the state to pickle, the items in the __slots__ of the
+        annotation classes without the memoised dictionary.
+        """
+        state = {}
+        for klass in type(self).__mro__:
+            for name in getattr(klass, '__slots__', ()):
+                if name != '_dict' and hasattr(self, name):
+                    state[name] = getattr(self, name)
+        return state
+
+    def __setstate__(self, state):
+        """Restore a pickled annotation. Annotations pickled before they had
+        __slots__ have a dict state rather than a (dict, slots) pair.
+        """
+        if isinstance(state, tuple):
+            dict_state, slots_state = state
+            state = {**(dict_state or {}), **(slots_state or {})}
+        self._dict = None
+        for name, value in state.items():
+            if name != '_dict':
+                setattr(self, name, value)
 
     def get_type(self):
         return self.__class__.__name__
@@ -470,9 +1414,17 @@ class Annotation(ABC):
         metadata instance.
         """
         self.created = datetime.datetime.fromisoformat(created)
+        self._dict = None
 
     def to_dict(self):
-        """Return principle data items in the form of a dictionary"""
+        """Return principle data items in the form of a dictionary.
+        The dictionary is memoised so it must not be changed.
+        """
+        if self._dict is None:
+            self._dict = self._to_dict()
+        return self._dict
+
+    def _to_dict(self):
         return {
             "type": self.__class__.__name__,
             "created": self.created.isoformat(),
@@ -481,7 +1433,13 @@ class Annotation(ABC):
 
     def to_json(self):
         """Serialize class to JSON"""
-        return json.dumps(self.to_dict())
+        return codec.dumps(self.to_dict())
+
+    def get_id(self) -> str:
+        """Return the annotation identity, a digest of the annotation content
+        that is the same for equal annotations. It is not part of to_dict().
+        """
+        return _annotation_id(self.to_dict())
 
 
 class PropertyChangeAnnotation(Annotation):
@@ -491,8 +1449,7 @@ class PropertyChangeAnnotation(Annotation):
 
     """
 
-    # meta_property: str = ''
-    # previous_value: str = ''
+    __slots__ = ('meta_property', 'previous_value')
 
     def __init__(self, meta_property: str, previous_value: str):
         assert property
@@ -500,13 +1457,16 @@ class PropertyChangeAnnotation(Annotation):
         self.previous_value = previous_value
         super().__init__()
 
-    def to_dict(self):
-        """Return principle data items in the form of a dictionary"""
+    def _set_items(self, annotation_dict: dict):
+        self.meta_property = annotation_dict['meta_property']
+        self.previous_value = annotation_dict['previous_value']
+
+    def _to_dict(self):
         output_dict = {
             "meta_property": self.meta_property,
             "previous_value": self.previous_value,
         }
-        return {**super().to_dict(), **output_dict}
+        return {**super()._to_dict(), **output_dict}
 
 
 class LabelAnnotation(Annotation):
@@ -527,26 +1487,31 @@ class LabelAnnotation(Annotation):
 
     """
 
+    __slots__ = ('label', 'value', 'active', 'reference')
+
     def __init__(
         self, label: str, value: str = None, active: bool = True, reference: str = None
     ):
         self.validate(label, value)
-        self.label = label.lower()
+        self.label = _intern(label.lower())
         self.value = value
         self.active = active
         self.reference = reference
         super().__init__()
 
+    def _set_items(self, annotation_dict: dict):
+        self.label = _intern(annotation_dict['label'])
+        self.value = annotation_dict['value']
+        self.active = annotation_dict['active']
+        self.reference = annotation_dict['reference']
+
     def validate(self, label: str, value: str = None):
         """Validate main data items"""
 
-        if not re.match(ANNOTATION_ERRORS['LabelAnnotation']['1']['regex'], label):
-            raise AnnotationValidationError('LabelAnnotation', '1', 'label')
+        validate('LabelAnnotation', '1', 'label', label)
 
-        if value and not re.match(
-            ANNOTATION_ERRORS['LabelAnnotation']['2']['regex'], value
-        ):
-            raise AnnotationValidationError('LabelAnnotation', '2', 'value')
+        if value:
+            validate('LabelAnnotation', '2', 'value', value)
 
     def get_label(self, label_types=None):
 
@@ -562,6 +1527,10 @@ class LabelAnnotation(Annotation):
         elif 'plain' in label_types and self.label[0] not in ['#', '@']:
             return self.label
 
+    def get_label_type(self):
+        """Returns the implicit type of the label: hash, address or plain"""
+        return _label_type(self.label)
+
     def get_value(self):
         return self.value
 
@@ -571,10 +1540,9 @@ class LabelAnnotation(Annotation):
     def get_reference(self):
         return self.reference
 
-    def to_dict(self):
-        """Return principle data items in the form of a dictionary"""
+    def _to_dict(self):
         return {
-            **super().to_dict(),
+            **super()._to_dict(),
             "label": self.label,
             "value": self.value,
             "active": self.active,
@@ -590,8 +1558,13 @@ class FieldsDescriptorAnnotation(Annotation):
     This is expected to be of the format:
     { "name": string, "type": string, "description": string, "active": boolean}
 
+    Each field is held as a FieldRecord and returned as a FIELD_DICT
+    dictionary.
+
     """
 
+    __slots__ = ('origin', 'description', 'fields')
+
     def __init__(self, origin: str = '', description: str = '', fields: dict = None):
 
         self.validate_origin(origin)
@@ -605,32 +1578,57 @@ class FieldsDescriptorAnnotation(Annotation):
             self.fields = {}
         super().__init__()
 
+    def _set_items(self, annotation_dict: dict):
+        self.origin = annotation_dict['origin']
+        self.description = annotation_dict['description']
+        self.fields = {
+            _intern(prop): FieldRecord(
+                _intern(values['type']),
+                _intern(values['description']),
+                values['required'],
+                values['active'],
+            )
+            for prop, values in annotation_dict['fields'].items()
+        }
+
+    def __setstate__(self, state):
+        """Restore a pickled annotation. The fields of annotations pickled
+        before the fields were held as FieldRecords are FIELD_DICT
+        dictionaries.
+        """
+        super().__setstate__(state)
+        self.fields = {
+            prop: values
+            if isinstance(values, FieldRecord)
+            else FieldRecord(
+                values['type'],
+                values['description'],
+                values['required'],
+                values['active'],
+            )
+            for prop, values in self.fields.items()
+        }
+
     def get_origin(self):
         return self.origin
 
     def validate_origin(self, origin: str):
-        if not re.match(
-            ANNOTATION_ERRORS['FieldsDescriptorAnnotation']['1']['regex'], origin
-        ):
-            raise AnnotationValidationError('FieldsDescriptorAnnotation', '1', 'origin')
+        validate('FieldsDescriptorAnnotation', '1', 'origin', origin)
 
     def set_origin(self, origin):
         self.validate_origin(origin)
         self.origin = origin
+        self._dict = None
 
     def get_description(self):
         return self.description
 
     def validate_description(self, description: str):
-        if not re.match(
-            ANNOTATION_ERRORS['FieldsDescriptorAnnotation']['2']['regex'], description
-        ):
-            raise AnnotationValidationError(
-                'FieldsDescriptorAnnotation', '2', 'description'
-            )
+        validate('FieldsDescriptorAnnotation', '2', 'description', description)
 
     def set_description(self, description):
         self.description = description
+        self._dict = None
 
     def validate_field(
         self, field_name: str, prop_type: str = None, description: str = None
@@ -638,32 +1636,25 @@ class FieldsDescriptorAnnotation(Annotation):
         """Validate an additions/updates to a field"""
 
         # field_name is required to be between 1 and 12 characters
-        if not re.match(
-            ANNOTATION_ERRORS['FieldsDescriptorAnnotation']['3']['regex'], field_name
-        ):
-            raise AnnotationValidationError(
-                'FieldsDescriptorAnnotation', '3', 'field_name', field_name
-            )
+        validate(
+            'FieldsDescriptorAnnotation', '3', 'field_name', field_name, field_name
+        )
 
         # type is enumerated. This can be omitted if updating an existing field
         if prop_type:
-            if (
-                prop_type.lower()
-                not in ANNOTATION_ERRORS['FieldsDescriptorAnnotation']['4']['enum']
-            ):
-                raise AnnotationValidationError(
-                    'FieldsDescriptorAnnotation', '4', 'type', field_name
-                )
+            validate(
+                'FieldsDescriptorAnnotation', '4', 'type', prop_type.lower(), field_name
+            )
 
         # description can be omitted but if it's there it must be < 255
         if description:
-            if not re.match(
-                ANNOTATION_ERRORS['FieldsDescriptorAnnotation']['5']['regex'],
+            validate(
+                'FieldsDescriptorAnnotation',
+                '5',
+                'description',
                 description,
-            ):
-                raise AnnotationValidationError(
-                    'FieldsDescriptorAnnotation', '5', 'description', field_name
-                )
+                field_name,
+            )
 
     def add_field(
         self,
@@ -679,23 +1670,24 @@ class FieldsDescriptorAnnotation(Annotation):
         self.validate_field(field_name, prop_type, description)
 
         # Add to list
-        if field_name not in self.fields:
-            # Note that this has to be copied in or it will reference the same
-            # dict.
-            self.fields[field_name] = copy.deepcopy(FIELD_DICT)
+        record = self.fields.get(field_name)
+        if record is None:
+            record = FieldRecord()
+            self.fields[_intern(field_name)] = record
 
-        self.fields[field_name]['active'] = active
+        record.active = active
 
         if prop_type:
-            self.fields[field_name]['type'] = prop_type.lower()
+            record.type = _intern(prop_type.lower())
         if description:
-            self.fields[field_name]['description'] = description
+            record.description = _intern(description)
         if required:
-            self.fields[field_name]['required'] = required
+            record.required = required
+        self._dict = None
 
     def get_property(self, field_name: str):
         """Get a property from the fields list identified by the name."""
-        return self.fields[field_name]
+        return self.fields[field_name].to_dict()
 
     def add_fields(self, new_fields: dict):
         """Add a dictionary of additions/updates to the fields list
@@ -723,22 +1715,21 @@ class FieldsDescriptorAnnotation(Annotation):
     def get_fields(self, get_all: bool = False):
         """Get (all/only active) fields from the property list in dict format."""
         if get_all:
-            return self.fields
+            return {prop: record.to_dict() for prop, record in self.fields.items()}
         else:
             # Return active fields only
             active_fields = {}
-            for prop, value in self.fields.items():
-                if value['active']:
-                    active_fields[prop] = value
+            for prop, record in self.fields.items():
+                if record.active:
+                    active_fields[prop] = record.to_dict()
             return active_fields
 
-    def to_dict(self):
-        """Return principle data items in the form of a dictionary"""
+    def _to_dict(self):
         return {
-            **super().to_dict(),
+            **super()._to_dict(),
             "origin": self.origin,
             "description": self.description,
-            "fields": self.fields,
+            "fields": self.get_fields(True),
         }
 
 
@@ -749,6 +1740,15 @@ class ServiceExecutionAnnotation(FieldsDescriptorAnnotation):
 
     """
 
+    __slots__ = (
+        'service',
+        'service_version',
+        'service_user',
+        'service_name',
+        'service_ref',
+        'service_parameters',
+    )
+
     def __init__(
         self,
         service: str,
@@ -778,75 +1778,61 @@ class ServiceExecutionAnnotation(FieldsDescriptorAnnotation):
             self.service_parameters = {}
         super().__init__(origin, description, fields)
 
+    def _set_items(self, annotation_dict: dict):
+        super()._set_items(annotation_dict)
+        self.service = annotation_dict['service']
+        self.service_version = annotation_dict['service_version']
+        self.service_user = annotation_dict['service_user']
+        self.service_name = annotation_dict['service_name']
+        self.service_ref = annotation_dict['service_ref']
+        self.service_parameters = annotation_dict['service_parameters']
+
     def get_service(self):
         return self.service
 
     def validate_service(self, service: str):
-        if not re.match(
-            ANNOTATION_ERRORS['ServiceExecutionAnnotation']['1']['regex'], service
-        ):
-            raise AnnotationValidationError(
-                'ServiceExecutionAnnotation', '1', 'service'
-            )
+        validate('ServiceExecutionAnnotation', '1', 'service', service)
 
     def get_service_version(self):
         return self.service_version
 
     def validate_service_version(self, service_version: str):
-        if not re.match(
-            ANNOTATION_ERRORS['ServiceExecutionAnnotation']['2']['regex'],
-            service_version,
-        ):
-            raise AnnotationValidationError(
-                'ServiceExecutionAnnotation', '2', 'service_version'
-            )
+        validate('ServiceExecutionAnnotation', '2', 'service_version', service_version)
 
     def get_service_user(self):
         return self.service_user
 
     def validate_service_user(self, service_user: str):
-        if not re.match(
-            ANNOTATION_ERRORS['ServiceExecutionAnnotation']['3']['regex'], service_user
-        ):
-            raise AnnotationValidationError(
-                'ServiceExecutionAnnotation', '3', 'service_user'
-            )
+        validate('ServiceExecutionAnnotation', '3', 'service_user', service_user)
 
     def get_service_name(self):
         return self.service_name
 
     def validate_service_name(self, service_name: str):
-        if not re.match(
-            ANNOTATION_ERRORS['ServiceExecutionAnnotation']['4']['regex'], service_name
-        ):
-            raise AnnotationValidationError(
-                'ServiceExecutionAnnotation', '4', 'service_name'
-            )
+        validate('ServiceExecutionAnnotation', '4', 'service_name', service_name)
 
     def get_service_ref(self):
         return self.service_ref
 
     def validate_service_ref(self, service_ref: str):
-        if not re.match(
-            ANNOTATION_ERRORS['ServiceExecutionAnnotation']['5']['regex'], service_ref
-        ):
-            raise AnnotationValidationError(
-                'ServiceExecutionAnnotation', '5', 'service_ref'
-            )
+        validate('ServiceExecutionAnnotation', '5', 'service_ref', service_ref)
 
     def get_service_parameters(self):
         return self.service_parameters
 
     def set_service_parameters(self, service_parameters: dict):
         self.service_parameters = copy.deepcopy(service_parameters)
+        self._dict = None
 
     def parameters_to_yaml(self):
+        # yaml is only needed here, so it is not imported with the module.
+        import yaml  # pylint: disable=import-outside-toplevel
+
         return yaml.dump(self.service_parameters)
 
-    def to_dict(self):
-        """Return principle data items in the form of a dictionary"""
+    def _to_dict(self):
         return {
-            **super().to_dict(),
+            **super()._to_dict(),
             "service": self.service,
             "service_version": self.service_version,
             "service_user": self.service_user,
@@ -856,6 +1842,34 @@ class ServiceExecutionAnnotation(FieldsDescriptorAnnotation):
         }
 
 
+# The annotation classes that can be created from an annotation dictionary
+# indexed by the type in the dictionary.
+_ANNOTATION_CLASSES = {
+    'PropertyChangeAnnotation': PropertyChangeAnnotation,
+    'FieldsDescriptorAnnotation': FieldsDescriptorAnnotation,
+    'ServiceExecutionAnnotation': ServiceExecutionAnnotation,
+}
+_LABEL_CLASSES = {'LabelAnnotation': LabelAnnotation}
+
+
+def _item_names(annotation_class) -> frozenset:
+    """Returns the names of the items in the dictionary returned by to_dict()
+    for an annotation class.
+    """
+    names = {'type'}
+    for klass in annotation_class.__mro__:
+        for name in getattr(klass, '__slots__', ()):
+            if not name.startswith('_'):
+                names.add(name)
+    return frozenset(names)
+
+
+_ITEM_NAMES = {
+    annotation_class: _item_names(annotation_class)
+    for annotation_class in [*_ANNOTATION_CLASSES.values(), *_LABEL_CLASSES.values()]
+}
+
+
 if __name__ == "__main__":
     print('Data Manager Metadata (v%s)', _METADATA_VERSION)
     print('Data Manager Annotation (v%s)', _ANNOTATION_VERSION)
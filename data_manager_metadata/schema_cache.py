@@ -0,0 +1,120 @@
+"""Data Manager Metadata json schema cache.
+
+    The json schema of a dataset version depends only on the dataset and
+    version metadata, so the schemas produced by data_tier_api are cached by
+    keys of the two metadata dictionaries. The same pairs are turned into
+    schemas repeatedly (after a patch, for each travelling copy, for each
+    get_version_schema call, ...).
+
+    The key of a metadata dictionary (metadata_key) has to be much cheaper
+    than producing the schema, so it does not hash the whole dictionary.
+    Annotations and labels are only ever appended to, so each list is
+    identified by its length and the identity of its last entry. The identity
+    is always computed from the entry itself rather than taken from the
+    checkpoint, which may be stale or copied from other metadata.
+
+    The cache holds a fixed maximum number of schemas and evicts the least
+    recently used. Schemas are copied into and out of the cache so that a
+    caller cannot change a cached schema, and the cache can be shared by
+    threads.
+"""
+import copy
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from .metadata import _annotation_id
+
+# The default maximum number of schemas held in a cache.
+_MAX_ENTRIES: int = 1024
+
+# The metadata items that the json schemas depend on, apart from the
+# annotations and labels.
+_KEY_ITEMS = ['dataset_id', 'dataset_name', 'description', 'dataset_version']
+
+# The annotation lists, which are keyed by their length and the identity of
+# their last entry.
+_KEY_LISTS = ['annotations', 'labels']
+
+
+def metadata_key(metadata_dict: Dict[str, Any]) -> Tuple:
+    """Returns a key for the json schemas of a metadata dictionary that has
+    only been changed through the library. It is made of the items the schema
+    depends on and the length and last annotation identity of the annotations
+    and labels, so only the last entry of each list is hashed.
+    """
+    key = [metadata_dict.get(item) for item in _KEY_ITEMS]
+    for list_name in _KEY_LISTS:
+        entries = metadata_dict.get(list_name) or []
+        entry_id = _annotation_id(entries[-1]) if entries else None
+        key += [len(entries), entry_id]
+    return tuple(key)
+
+
+class SchemaCache:
+    """Class SchemaCache
+
+    Purpose: A least recently used cache of json schemas with counters of the
+    hits, misses and evictions.
+
+    """
+
+    def __init__(self, max_entries: int = _MAX_ENTRIES):
+        assert max_entries >= 0
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._schemas: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._schemas)
+
+    def get(self, key: Hashable) -> Optional[Dict[str, Any]]:
+        """Returns a copy of the schema cached with a key, or None if there is
+        no such schema.
+        """
+        with self._lock:
+            schema = self._schemas.get(key)
+            if schema is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._schemas.move_to_end(key)
+        # Cached schemas are never changed, so they can be copied unlocked.
+        return copy.deepcopy(schema)
+
+    def put(self, key: Hashable, schema: Dict[str, Any]):
+        """Cache a copy of a schema with a key, evicting the least recently
+        used schemas if the cache is full.
+        """
+        if self.max_entries == 0:
+            return
+        schema = copy.deepcopy(schema)
+        with self._lock:
+            self._schemas[key] = schema
+            self._schemas.move_to_end(key)
+            while len(self._schemas) > self.max_entries:
+                self._schemas.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Remove all the schemas and reset the counters"""
+        with self._lock:
+            self._schemas.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the counters and the number of cached schemas"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._schemas),
+                'max_entries': self.max_entries,
+            }
@@ -0,0 +1,94 @@
+"""Data Manager Metadata Validators.
+
+    The rules in ANNOTATION_ERRORS are compiled once, when this module is
+    imported, into a check function for each annotation type and error.
+    - Regex rules are precompiled.
+    - Rules that only limit the length of a line of text (^.{m,n}$) become
+    length checks that do not scan the value.
+    - Other rules that repeat one character class (^[...]{m,n}$) reject
+    values that are too long before the regex is run.
+    - Enumerated rules become a frozenset membership test.
+
+    The checks keep the semantics of re.match on the original pattern,
+    including the newline handling of '.' and '$'.
+"""
+import re
+from typing import Any, Callable, Dict
+
+from .exceptions import ANNOTATION_ERRORS, AnnotationValidationError
+
+# A rule that is a single character class repeated between m and n times.
+_REPEAT_RULE = re.compile(r'^\^(\.|\[[^\]]*\])\{(\d+),(\d+)\}\$$')
+
+
+def _length_check(pattern: Any, min_length: int, max_length: int) -> Callable:
+    """Returns a check equivalent to re.match(r'^.{m,n}$', value).
+    '.' matches anything except a newline and '$' also matches before a
+    trailing newline, so the value can end with one newline that is not
+    counted.
+    """
+
+    def check(value: str) -> bool:
+        if type(value) is not str:  # pylint: disable=unidiomatic-typecheck
+            # Leave re to accept or reject anything else.
+            return pattern.match(value) is not None
+        length = len(value)
+        if length and value[-1] == '\n':
+            length -= 1
+        if not min_length <= length <= max_length:
+            return False
+        # The length is limited at this point, so this is too.
+        return value.find('\n', 0, length) == -1
+
+    return check
+
+
+def _bounded_regex_check(pattern: Any, max_length: int) -> Callable:
+    """Returns a check for a regex that cannot match a value longer than
+    max_length characters (plus a trailing newline).
+    """
+
+    def check(value: str) -> bool:
+        if type(value) is str and len(value) > max_length + 1:
+            return False
+        return pattern.match(value) is not None
+
+    return check
+
+
+def _compile_rule(rule: Dict[str, Any]) -> Callable:
+    """Returns the check function for a rule in ANNOTATION_ERRORS"""
+    if 'enum' in rule:
+        enum = frozenset(rule['enum'])
+        return lambda value: value in enum
+
+    pattern = re.compile(rule['regex'])
+    repeat = _REPEAT_RULE.match(rule['regex'])
+    if repeat:
+        if repeat.group(1) == '.':
+            return _length_check(pattern, int(repeat.group(2)), int(repeat.group(3)))
+        return _bounded_regex_check(pattern, int(repeat.group(3)))
+    return lambda value: pattern.match(value) is not None
+
+
+# The check functions indexed by annotation type and error number.
+VALIDATORS: Dict[str, Dict[str, Callable]] = {
+    annotation_type: {error: _compile_rule(rule) for error, rule in rules.items()}
+    for annotation_type, rules in ANNOTATION_ERRORS.items()
+    if rules
+}
+
+
+def is_valid(annotation_type: str, error: str, value: Any) -> bool:
+    """Returns True if the value passes the ANNOTATION_ERRORS rule"""
+    return VALIDATORS[annotation_type][error](value)
+
+
+def validate(
+    annotation_type: str, error: str, field: str, value: Any, field_value: str = None
+):
+    """Raises an AnnotationValidationError if the value fails the
+    ANNOTATION_ERRORS rule.
+    """
+    if not VALIDATORS[annotation_type][error](value):
+        raise AnnotationValidationError(annotation_type, error, field, field_value)
@@ -26,6 +26,34 @@ Examples:
                         -fd='Run smina docking' -af=test/output
     - create a service execution annotation in an annotations.json file placed in test/output.
 
+    python md_manage.py lb 'label' -lv='blob' -af=test/output --json-lines
+    - as above, but the annotations file is written as JSON Lines (one annotation per line), so
+    each new annotation is appended to the end of the file without reading it. An existing
+    annotations file that is a JSON array is converted. Once a file is JSON Lines, annotations
+    are always appended to it.
+
+    python md_manage.py batch specs.txt
+    cat specs.txt | python md_manage.py batch
+    - create many annotations in one run. Each (non-blank) line of the file (or stdin) is an
+    lb, fd or se command written as it would be for md_manage.py, for example:
+        lb test/output/results.sdf 'label' -lv='blob'
+        se test/output/results.sdf -su=bob -sys='run-smina' -sy='test/input/virtual-screening.yaml'
+    Lines starting with '#' are ignored. Yaml files are only read once, and each annotations
+    file is written once with all of its new annotations, in the order of the lines.
+
+    python md_manage.py serve /tmp/md_manage.sock
+    - run a server that creates annotations for requests sent to a UNIX domain socket, so that
+    a workflow can add annotations without starting a process for each one. Each request is a
+    line of JSON with the arguments of an lb, fd or se command, either as a list or a string:
+        {"args": ["lb", "test/output/results.sdf", "label", "-lv=blob"]}
+        {"line": "lb test/output/results.sdf 'label' -lv='blob'"}
+    and gets a line of JSON in reply once the annotation has been written:
+        {"ok": true, "file": "test/output/results.sdf.annotations"}
+    or {"ok": false, "error": "..."}. A {"shutdown": true} request stops the server. The
+    requests that arrive together (within --flush-interval) are written to each annotations
+    file at once, and yaml files and JSON Lines annotations files are kept open between
+    requests. See send_requests() for a client.
+
 
 See the README for more details.
 
@@ -33,15 +61,22 @@ See the README for more details.
 
 import argparse
 import os
+import selectors
+import shlex
+import signal
+import socket
+import stat
 import sys
-import json
+import time
+from collections import OrderedDict
 from yaml import safe_load
 from data_manager_metadata.metadata import (FIELD_DICT,
                                             get_annotation_filename,
-                                            Metadata,
                                             LabelAnnotation,
                                             FieldsDescriptorAnnotation,
                                             ServiceExecutionAnnotation)
+from data_manager_metadata import codec
+from data_manager_metadata.json_stream import iter_annotations
 
 
 def add_label_annotation_args(parser):
@@ -56,10 +91,19 @@ def add_label_annotation_args(parser):
     parser.add_argument('-lv', '--value', type=str, help='Value to attach the label, optional')
     parser.add_argument('--make-inactive', action = 'store_false', help='When set, this makes the '
                                                    'label inactive')
+    add_json_lines_arg(parser)
 
     parser.set_defaults(func=create_label_annotation)
 
 
+def add_json_lines_arg(parser):
+    """Add the argument for the JSON Lines annotations file format
+    """
+    parser.add_argument('-jl', '--json-lines', action='store_true',
+                        help='Write the annotations file as JSON Lines (one annotation per line) '
+                             'so that annotations are appended without rewriting the file')
+
+
 def add_fields_descriptor_annotation_args(parser):
     """Add arguments for the fields descriptor annotation formatter
     """
@@ -74,6 +118,7 @@ def add_fields_descriptor_annotation_args(parser):
                         help='Add a field in comma separated form in order: name,type,'
                              'description,required,active,semantic_ref. Fields: required, active '
                              'and semantic-ref are optional ')
+    add_json_lines_arg(parser)
 
     parser.set_defaults(func=create_fields_descriptor_annotation)
 
@@ -113,6 +158,29 @@ def add_service_execution_annotation_args(parser):
     parser.set_defaults(func=create_service_execution_annotation)
 
 
+def add_batch_args(parser):
+    """Add arguments for the batch of annotations
+    """
+    parser.add_argument('specs', nargs='?', type=argparse.FileType('rt'), default=sys.stdin,
+                        help='File of lb, fd or se commands, one on each line. '
+                             'If not given, the commands are read from stdin')
+    add_json_lines_arg(parser)
+
+    parser.set_defaults(func=None)
+
+
+def add_serve_args(parser):
+    """Add arguments for the annotation server
+    """
+    parser.add_argument('socket', type=str, help='Path of the UNIX domain socket to listen on')
+    parser.add_argument('--flush-interval', type=float, default=_FLUSH_INTERVAL,
+                        help='Seconds to wait for more requests before writing the '
+                             'annotations of a request (default %(default)s)')
+    add_json_lines_arg(parser)
+
+    parser.set_defaults(func=None)
+
+
 def create_label_annotation(args):
     """Add a label annotation to the annotation json file
     """
@@ -127,7 +195,7 @@ def _create_field_dict(fields : str):
     # fields are of the form: name: (type,description,required,semantic-type)
     prop_list = fields.split(',')
     name = prop_list[0]
-    field_dict[name] = FIELD_DICT
+    field_dict[name] = dict(FIELD_DICT)
     field_dict[name]['type'] = prop_list[1]
     field_dict[name]['description'] = prop_list[2]
     if len(prop_list) > 3:
@@ -150,6 +218,36 @@ def create_fields_descriptor_annotation(args):
     return FieldsDescriptorAnnotation(args.origin, args.description, field_dict)
 
 
+# The seconds the server waits for more requests before writing annotations.
+_FLUSH_INTERVAL: float = 0.01
+# The most seconds the server waits in select(), so that shutdown() is noticed.
+_POLL_INTERVAL: float = 0.5
+# The most JSON Lines annotations files the server keeps open.
+_MAX_OPEN_FILES: int = 64
+# The most bytes of unfinished request, or of unsent replies, the server holds for a
+# connection. A client that sends a longer line or does not read its replies is dropped.
+_MAX_BUFFER_SIZE: int = 1 << 20
+
+# The modification time and parsed contents of yaml files, keyed by filename, so that a
+# yaml file is only parsed once by a batch of annotations. A file that has changed replaces
+# its entry, so there is one entry for each file.
+_YAML_CACHE: dict = {}
+
+
+def _load_yaml(filename: str):
+    """Returns the parsed contents of a yaml file, reading it only if it has not been read
+       already (or has changed since).
+    """
+    path = os.path.abspath(filename)
+    mtime_ns = os.stat(filename).st_mtime_ns
+    cached = _YAML_CACHE.get(path)
+    if cached is None or cached[0] != mtime_ns:
+        with open(filename, 'rt') as yaml_file:
+            cached = (mtime_ns, safe_load(yaml_file))
+        _YAML_CACHE[path] = cached
+    return cached[1]
+
+
 def _params_from_file(filename: str, section: str, param_dict: dict):
     """Parameters can be added from a supplied yaml file.
 
@@ -158,23 +256,21 @@ def _params_from_file(filename: str, section: str, param_dict: dict):
     """
 
     if not os.path.isfile(filename):
-        print('Yaml file does not exist in this location')
-        sys.exit(1)
+        raise CommandError('Yaml file does not exist in this location', 1)
 
-    with open(filename, 'rt') as yaml_file:
-        yaml_dict = safe_load(yaml_file)
-        service_dict = yaml_dict['jobs'][section]
+    yaml_dict = _load_yaml(filename)
+    service_dict = yaml_dict['jobs'][section]
 
-        param_dict['service'] = section
-        param_dict['service_version'] = service_dict['version']
-        param_dict['service_name'] = service_dict['name']
+    param_dict['service'] = section
+    param_dict['service_version'] = service_dict['version']
+    param_dict['service_name'] = service_dict['name']
 
-        # This is required in the annotation, so it should either be a required parameter or
-        # added to the yaml.
-        param_dict['service_ref'] = 'tba'
-        param_dict['service_parameters'] = {'container_image': service_dict['image'],
-                                            'container-command': service_dict['command'],
-                                            }
+    # This is required in the annotation, so it should either be a required parameter or
+    # added to the yaml.
+    param_dict['service_ref'] = 'tba'
+    param_dict['service_parameters'] = {'container_image': service_dict['image'],
+                                        'container-command': service_dict['command'],
+                                        }
 
     return param_dict
 
@@ -248,17 +344,137 @@ def create_service_execution_annotation(args):
     return ServiceExecutionAnnotation(**param_dict)
 
 
-if __name__ == '__main__':
-    """Add an annotation to the annotation json file using the given parameters
-    
-       parameters are specific to the requested annotation.
-       A filepath for an annotations file can be optionally provided. 
-       If the annotations file already exists, then the annotation will be added to it
-       in the form of an array.
-               
+# The most bytes read from the start of an annotations file to tell if it is JSON Lines.
+_SNIFF_SIZE: int = 4096
+
+
+def _is_json_lines(anno_file: str):
+    """Returns True if an annotations file is JSON Lines, which is if its first line is a
+       complete annotation (rather than the start of a JSON array or of an annotation written
+       over several lines).
+
+       Only the first _SNIFF_SIZE bytes are read. If the first line is longer than that it
+       cannot be the start of an annotation written over several lines (which starts with a
+       line holding just the brace), so it is taken to be a complete annotation.
+    """
+    with open(anno_file, 'rb') as existing_annotations:
+        data = existing_annotations.read(_SNIFF_SIZE)
+    prefix = data.lstrip()
+    if not prefix.startswith(b'{'):
+        return False
+    line_end = prefix.find(b'\n')
+    if line_end == -1:
+        if len(data) == _SNIFF_SIZE:
+            return True
+        line_end = len(prefix)
+    try:
+        codec.loads(prefix[:line_end])
+    except ValueError:
+        return False
+    return True
+
+
+def write_annotations(anno_file: str, annos: list, json_lines: bool = False):
+    """Add annotations to an annotations file, creating the file if it does not exist.
+
+       If the file is JSON Lines (or json_lines is set and the file does not exist yet) the
+       annotations are appended as new lines without reading the file. Otherwise the file is a
+       JSON array, which has to be rewritten with the annotations added to the end (and if
+       json_lines is set, it is rewritten as JSON Lines instead).
+    """
+    new_lines = ''.join(anno.to_json() + '\n' for anno in annos)
+    if os.path.isfile(anno_file) and _is_json_lines(anno_file):
+        with open(anno_file, 'rb+') as out_file:
+            # Make sure the new annotations start on a line of their own.
+            out_file.seek(0, os.SEEK_END)
+            if out_file.tell():
+                out_file.seek(-1, os.SEEK_END)
+                if out_file.read(1) != b'\n':
+                    out_file.write(b'\n')
+            out_file.write(new_lines.encode('utf-8'))
+        return
+
+    if json_lines and not os.path.isfile(anno_file):
+        with open(anno_file, 'wt') as out_file:
+            out_file.write(new_lines)
+        return
+
+    # Write the list of annotations to a new file with the new annotations added to the end.
+    # If the annotations file already exists, the annotations in it are copied across as
+    # they are read, so the whole file is never loaded.
+    separator = '\n' if json_lines else ', '
+    new_anno_file = anno_file + '.new'
+    with open(new_anno_file, 'wt') as out_file:
+        if not json_lines:
+            out_file.write('[')
+        if os.path.isfile(anno_file):
+            with open(anno_file, 'rt') as existing_annotations:
+                for annotation_row in iter_annotations(existing_annotations):
+                    codec.dump(annotation_row, out_file)
+                    out_file.write(separator)
+        if json_lines:
+            out_file.write(new_lines)
+        else:
+            out_file.write(separator.join(anno.to_json() for anno in annos) + ']')
+    os.replace(new_anno_file, anno_file)
+
+
+def write_annotation(anno_file: str, anno, json_lines: bool = False):
+    """Add an annotation to an annotations file, creating the file if it does not exist.
     """
+    write_annotations(anno_file, [anno], json_lines)
 
-    parser = argparse.ArgumentParser('Metadata Annotation Generator')
+
+def get_annotations_file(filepath: str):
+    """Returns the annotations file of a (results) file, creating its directory if needed.
+    """
+    file_name = os.path.basename(filepath)
+    file_dir = os.path.dirname(filepath)
+
+    annotations_filename = get_annotation_filename(file_name)
+
+    if file_dir and not os.path.exists(file_dir):
+        os.makedirs(file_dir)
+    return os.path.join(file_dir, annotations_filename)
+
+
+class CommandError(Exception):
+    """Exception raised for a command that is not valid, in place of printing the error and
+    exiting, so that a batch or the server can report it.
+
+    Attributes:
+       message -- the error, which the command line prints (None if there is nothing to print)
+       status -- the exit status of the command line
+    """
+
+    def __init__(self, message: str = None, status: int = 2):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+    def __str__(self):
+        return self.message or ''
+
+
+class _CommandParser(argparse.ArgumentParser):
+    """Argument parser that raises a CommandError rather than printing an error (or its help)
+    and exiting
+    """
+
+    def print_help(self, file=None):
+        raise CommandError(self.format_help().rstrip(), 0)
+
+    def error(self, message):
+        raise CommandError('%s%s: error: %s' % (self.format_usage(), self.prog, message))
+
+    def exit(self, status=0, message=None):
+        raise CommandError(message.strip() if message else None, status)
+
+
+def build_parser():
+    """Returns the command line parser for the annotation types and the batch command
+    """
+    parser = _CommandParser('Metadata Annotation Generator')
     subparsers = parser.add_subparsers(help='Please choose an annotation type')
 
     # Parser for Label Annotation
@@ -274,29 +490,400 @@ if __name__ == '__main__':
     add_fields_descriptor_annotation_args(parser_se)
     add_service_execution_annotation_args(parser_se)
 
-    args = parser.parse_args()
-    assert args.filepath
-    file_name = os.path.basename(args.filepath)
-    file_dir = os.path.dirname(args.filepath)
+    # Parser for a batch of annotations
+    parser_batch = subparsers.add_parser('batch', help='Batch of lb, fd or se commands')
+    add_batch_args(parser_batch)
 
-    annotations_filename = get_annotation_filename(file_name)
+    # Parser for the annotation server
+    parser_serve = subparsers.add_parser('serve', help='Serve lb, fd or se requests on a socket')
+    add_serve_args(parser_serve)
 
-    if not os.path.exists(file_dir):
-        os.makedirs(file_dir)
-    anno_file = os.path.join(file_dir, annotations_filename)
+    return parser
+
+
+def _parse_batch_line(parser, line: str, line_number: int):
+    """Parse an lb, fd or se command from a batch, raising a CommandError if it is not valid
+    """
+    argv = shlex.split(line)
+    if argv[0] not in ('lb', 'fd', 'se'):
+        raise CommandError('Batch line %d is not an lb, fd or se command: %s'
+                           % (line_number, line))
+    try:
+        return parser.parse_args(argv)
+    except CommandError as error:
+        raise CommandError('%s\nBatch line %d is not a valid annotation command: %s'
+                           % (error, line_number, line), error.status) from error
+
+
+def run_batch(specs, json_lines: bool = False):
+    """Create the annotations for the lb, fd or se commands in the lines of specs.
+
+       All the commands are parsed and their annotations created before any file is written,
+       so a bad command leaves the annotations files unchanged. Then each annotations file is
+       written once, with its annotations in the order of the commands. Returns the number of
+       annotations written to each annotations file, or raises a CommandError for a bad
+       command.
+    """
+    parser = build_parser()
+    file_annotations: dict = {}
+    file_json_lines: dict = {}
+    for line_number, line in enumerate(specs, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        args = _parse_batch_line(parser, line, line_number)
+        assert args.filepath
+        anno_file = get_annotations_file(args.filepath)
+        file_annotations.setdefault(anno_file, []).append(args.func(args))
+        file_json_lines[anno_file] = (file_json_lines.get(anno_file, json_lines)
+                                      or args.json_lines)
+
+    for anno_file, annos in file_annotations.items():
+        write_annotations(anno_file, annos, file_json_lines[anno_file])
+    return {anno_file: len(annos) for anno_file, annos in file_annotations.items()}
+
+
+class AnnotationServer:
+    """Class AnnotationServer
+
+    Purpose: Creates annotations for lb, fd and se requests sent to a UNIX domain socket.
+
+    Requests are lines of JSON, {"args": [...]} or {"line": "..."}, and each gets a line of JSON
+    in reply, in order, once its annotation has been written. The annotations of the requests
+    that arrive within flush_interval of each other are written together, so each annotations
+    file is written once for all of them. Parsed yaml files are cached (see _load_yaml) and
+    JSON Lines annotations files are kept open for appending.
+
+    The socket is only accessible to its owner, and is only removed by the server that created
+    it. Connections are non-blocking and the replies
+    are sent as each client reads them, so a slow client does not hold up the others.
+    """
 
-    # Create a metadata class to act as a holder for annotations
-    meta_holder = Metadata('dm', 'dm', 'dm', 'dm')
+    def __init__(self, socket_path: str, flush_interval: float = _FLUSH_INTERVAL,
+                 json_lines: bool = False, max_open_files: int = _MAX_OPEN_FILES):
+        self.socket_path = socket_path
+        self.flush_interval = flush_interval
+        self.json_lines = json_lines
+        self.max_open_files = max_open_files
+        self._parser = build_parser()
+        self._selector = selectors.DefaultSelector()
+        self._running = False
+        # Unread request data for each connection.
+        self._buffers: dict = {}
+        # Unsent replies, for each connection that has any.
+        self._outgoing: dict = {}
+        # Annotations waiting to be written, for each annotations file.
+        self._pending: dict = {}
+        self._pending_json_lines: dict = {}
+        # Replies waiting for their annotations to be written: (connection, file, reply)
+        self._replies: list = []
+        self._flush_time = None
+        self._open_files: OrderedDict = OrderedDict()
+
+    def shutdown(self):
+        """Stop the server once the waiting annotations have been written
+        """
+        self._running = False
+
+    def serve_forever(self):
+        """Serve requests until shutdown() is called or a shutdown request is received
+        """
+        self._remove_stale_socket()
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        bound_id = None
+        try:
+            # The socket is created only accessible to its owner.
+            umask = os.umask(0o177)
+            try:
+                listener.bind(self.socket_path)
+            finally:
+                os.umask(umask)
+            socket_stat = os.stat(self.socket_path)
+            bound_id = (socket_stat.st_dev, socket_stat.st_ino)
+            listener.listen()
+            self._selector.register(listener, selectors.EVENT_READ)
+            self._running = True
+            while self._running:
+                timeout = _POLL_INTERVAL
+                if self._flush_time is not None:
+                    timeout = min(timeout, max(0.0, self._flush_time - time.monotonic()))
+                for key, events in self._selector.select(timeout):
+                    if key.fileobj is listener:
+                        connection, _ = listener.accept()
+                        connection.setblocking(False)
+                        self._buffers[connection] = b''
+                        self._selector.register(connection, selectors.EVENT_READ)
+                        continue
+                    if events & selectors.EVENT_READ:
+                        self._read(key.fileobj)
+                    if events & selectors.EVENT_WRITE and key.fileobj in self._outgoing:
+                        self._send(key.fileobj)
+                if self._flush_time is not None and time.monotonic() >= self._flush_time:
+                    self._flush()
+            self._flush()
+            self._drain(listener)
+        finally:
+            for connection in list(self._buffers):
+                self._close(connection)
+            self._selector.close()
+            listener.close()
+            for out_file in self._open_files.values():
+                out_file.close()
+            self._open_files.clear()
+            self._remove_own_socket(bound_id)
+
+    def _remove_stale_socket(self):
+        """Remove a socket left at the socket path by a server that did not stop cleanly,
+           raising a CommandError if a server is still listening on it
+        """
+        try:
+            if not stat.S_ISSOCK(os.stat(self.socket_path).st_mode):
+                return
+        except FileNotFoundError:
+            return
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            try:
+                probe.connect(self.socket_path)
+            except ConnectionRefusedError:
+                os.unlink(self.socket_path)
+                return
+        raise CommandError('A server is already listening on %s' % self.socket_path, 1)
+
+    def _remove_own_socket(self, bound_id):
+        """Remove the socket path if it is still the socket this server bound, and not one
+           that has replaced it
+        """
+        if bound_id is None:
+            return
+        try:
+            socket_stat = os.stat(self.socket_path)
+        except FileNotFoundError:
+            return
+        if (socket_stat.st_dev, socket_stat.st_ino) == bound_id:
+            os.unlink(self.socket_path)
+
+    def _close(self, connection):
+        """Stop serving a connection
+        """
+        self._selector.unregister(connection)
+        del self._buffers[connection]
+        self._outgoing.pop(connection, None)
+        connection.close()
+
+    def _drop(self, connection):
+        """Stop serving a connection and forget the replies waiting to be sent to it
+        """
+        self._replies = [reply for reply in self._replies if reply[0] is not connection]
+        self._close(connection)
+
+    def _read(self, connection):
+        """Handle the complete requests received on a connection
+        """
+        try:
+            data = connection.recv(65536)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b''
+        if not data:
+            self._drop(connection)
+            return
+        lines = (self._buffers[connection] + data).split(b'\n')
+        self._buffers[connection] = lines.pop()
+        if len(self._buffers[connection]) > _MAX_BUFFER_SIZE:
+            self._drop(connection)
+            return
+        for line in lines:
+            if line.strip():
+                self._handle(connection, line)
+
+    def _send(self, connection):
+        """Send as much of the unsent replies of a connection as it will take without waiting
+        """
+        outgoing = self._outgoing[connection]
+        try:
+            sent = connection.send(outgoing)
+        except BlockingIOError:
+            sent = 0
+        except OSError:
+            self._drop(connection)
+            return
+        del outgoing[:sent]
+        if outgoing:
+            self._selector.modify(connection, selectors.EVENT_READ | selectors.EVENT_WRITE)
+        else:
+            del self._outgoing[connection]
+            self._selector.modify(connection, selectors.EVENT_READ)
+
+    def _drain(self, listener):
+        """Send the unsent replies before the server stops, waiting at most _POLL_INTERVAL
+        """
+        self._selector.unregister(listener)
+        for connection in list(self._buffers):
+            if connection in self._outgoing:
+                self._selector.modify(connection, selectors.EVENT_WRITE)
+            else:
+                self._close(connection)
+        deadline = time.monotonic() + _POLL_INTERVAL
+        while self._outgoing and time.monotonic() < deadline:
+            for key, _ in self._selector.select(max(0.0, deadline - time.monotonic())):
+                outgoing = self._outgoing[key.fileobj]
+                try:
+                    del outgoing[:key.fileobj.send(outgoing)]
+                except BlockingIOError:
+                    continue
+                except OSError:
+                    outgoing.clear()
+                if not outgoing:
+                    self._close(key.fileobj)
+
+    def _handle(self, connection, line: bytes):
+        """Create the annotation of a request, to be written at the next flush
+        """
+        if self._flush_time is None:
+            self._flush_time = time.monotonic() + self.flush_interval
+        try:
+            request = codec.loads(line.decode('utf-8'))
+            if request.get('shutdown'):
+                self.shutdown()
+                self._replies.append((connection, None, {'ok': True}))
+                return
+            args = self._parse_request(request)
+            anno = args.func(args)
+            anno_file = get_annotations_file(args.filepath)
+        except CommandError as error:
+            # The error (or help) that the command line would have printed.
+            error_text = str(error).strip() or 'Invalid request'
+            self._replies.append((connection, None, {'ok': False, 'error': error_text}))
+            return
+        except Exception as error:  # pylint: disable=broad-except
+            error_text = str(error) or type(error).__name__
+            self._replies.append((connection, None, {'ok': False, 'error': error_text}))
+            return
+        self._pending.setdefault(anno_file, []).append(anno)
+        json_lines = self._pending_json_lines.get(anno_file, self.json_lines)
+        self._pending_json_lines[anno_file] = json_lines or args.json_lines
+        self._replies.append((connection, anno_file, {'ok': True, 'file': anno_file}))
+
+    def _parse_request(self, request: dict):
+        """Returns the parsed arguments of an lb, fd or se request
+        """
+        if 'args' in request:
+            argv = [str(arg) for arg in request['args']]
+        else:
+            argv = shlex.split(request['line'])
+        if not argv or argv[0] not in ('lb', 'fd', 'se'):
+            raise ValueError('Not an lb, fd or se request')
+        return self._parser.parse_args(argv)
+
+    def _write(self, anno_file: str, annos: list, json_lines: bool):
+        """Add annotations to an annotations file, appending to it if it is open already
+        """
+        out_file = self._open_files.pop(anno_file, None)
+        if out_file is not None:
+            try:
+                file_stat = os.stat(anno_file)
+                open_stat = os.fstat(out_file.fileno())
+                if (file_stat.st_dev, file_stat.st_ino) != (open_stat.st_dev, open_stat.st_ino):
+                    raise FileNotFoundError(anno_file)
+            except FileNotFoundError:
+                # The file has been replaced or removed since it was opened.
+                out_file.close()
+                out_file = None
+        if out_file is None:
+            write_annotations(anno_file, annos, json_lines)
+            if not _is_json_lines(anno_file):
+                return
+            out_file = open(anno_file, 'at')  # pylint: disable=consider-using-with
+        else:
+            out_file.write(''.join(anno.to_json() + '\n' for anno in annos))
+            out_file.flush()
+        self._open_files[anno_file] = out_file
+        while len(self._open_files) > self.max_open_files:
+            self._open_files.popitem(last=False)[1].close()
+
+    def _flush(self):
+        """Write the waiting annotations and send the replies to their requests
+        """
+        errors: dict = {}
+        for anno_file, annos in self._pending.items():
+            try:
+                self._write(anno_file, annos, self._pending_json_lines[anno_file])
+            except Exception as error:  # pylint: disable=broad-except
+                errors[anno_file] = str(error) or type(error).__name__
+        for connection, anno_file, reply in self._replies:
+            if anno_file in errors:
+                reply = {'ok': False, 'error': errors[anno_file]}
+            if connection in self._buffers:
+                self._outgoing.setdefault(connection, bytearray()).extend(
+                    (codec.dumps(reply) + '\n').encode('utf-8'))
+        for connection in list(self._outgoing):
+            if len(self._outgoing[connection]) > _MAX_BUFFER_SIZE:
+                self._close(connection)
+            else:
+                self._send(connection)
+        self._pending.clear()
+        self._pending_json_lines.clear()
+        self._replies.clear()
+        self._flush_time = None
+
+
+def send_requests(socket_path: str, requests: list):
+    """Send requests to an annotation server and return its replies.
+
+       Each request is either a list of the arguments of an lb, fd or se command, or a
+       dictionary request (e.g. {"shutdown": true}).
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_path)
+        data = ''.join(codec.dumps(request if isinstance(request, dict) else {'args': request})
+                       + '\n' for request in requests)
+        client.sendall(data.encode('utf-8'))
+        replies = []
+        with client.makefile('r', encoding='utf-8') as reply_file:
+            for _ in requests:
+                replies.append(codec.loads(reply_file.readline()))
+    return replies
 
-    if os.path.isfile(anno_file):
-        # Annotations File already exists - import any annotations and add to the holder
-        with open(anno_file, 'rt') as existing_annotations:
-            meta_holder.add_annotations(existing_annotations.read())
 
-    # Create the new annotation and add to the list
-    anno = args.func(args)
-    meta_holder.add_annotation(anno)
+if __name__ == '__main__':
+    """Add an annotation to the annotation json file using the given parameters
+    
+       parameters are specific to the requested annotation.
+       A filepath for an annotations file can be optionally provided. 
+       If the annotations file already exists, then the annotation will be added to it
+       in the form of an array, or as a new line if it is a JSON Lines file.
+       The batch command adds the annotations of many commands in one run, and the serve
+       command adds the annotations of requests sent to a socket.
+               
+    """
 
-    # Recreate output and write the list of annotations to it.
-    out_file = open(anno_file, "w")
-    json.dump(meta_holder.get_annotations_dict(), out_file)
+    try:
+        args = build_parser().parse_args()
+
+        if args.func is None:
+            if hasattr(args, 'specs'):
+                run_batch(args.specs, args.json_lines)
+            else:
+                server = AnnotationServer(args.socket, args.flush_interval, args.json_lines)
+                signal.signal(signal.SIGTERM, lambda signum, frame: server.shutdown())
+                try:
+                    server.serve_forever()
+                except KeyboardInterrupt:
+                    pass
+            sys.exit(0)
+
+        assert args.filepath
+        anno_file = get_annotations_file(args.filepath)
+
+        # Create the new annotation
+        anno = args.func(args)
+    except CommandError as command_error:
+        # Invalid commands raise the error (or help) that argparse would have printed before
+        # exiting.
+        if command_error.message:
+            print(command_error.message,
+                  file=sys.stdout if command_error.status == 0 else sys.stderr)
+        sys.exit(command_error.status)
+
+    write_annotation(anno_file, anno, args.json_lines)
@@ -1,27 +1,40 @@
 import unittest
+from unittest import mock
 import os
 import json
+import subprocess
+import sys
 
 # from yaml import safe_load
 # from decoder import decoder
 
 from data_manager_metadata.metadata import (
     FieldsDescriptorAnnotation,
+    LabelAnnotation,
+    Metadata,
     ServiceExecutionAnnotation,
     _DEFAULT_SYNC_TIME,
 )
 
+from data_manager_metadata.schema_cache import SchemaCache, metadata_key
 from data_manager_metadata.data_tier_api import (
     post_dataset_metadata,
     post_version_metadata,
     patch_dataset_metadata,
     get_version_schema,
+    get_version_schemas,
+    recompute_version_schemas,
+    schema_cache,
     patch_version_metadata,
     get_travelling_metadata,
     patch_travelling_metadata,
     post_travelling_metadata_to_new_dataset,
     post_travelling_metadata_to_existing_dataset,
     create_job_annotations,
+    create_delta,
+    apply_delta,
+    configure_basic_logger,
+    _version_schema_tasks,
 )
 
 
@@ -151,6 +164,97 @@ class DataTierTestCase(unittest.TestCase):
 
         print('\nTest 4.1 ok')
 
+        print('4.2 get_version_schemas')
+        version_list = [
+            post_version_metadata(dataset_metadata, version)[0]
+            for version in range(1, 4)
+        ]
+        version_list[1], dummy = patch_version_metadata(
+            new_dataset_metadata, version_list[1], description='version 2'
+        )
+        version_schemas = list(get_version_schemas(new_dataset_metadata, version_list))
+        self.assertEqual(len(version_schemas), 3)
+        for version_metadata, version_schema in zip(version_list, version_schemas):
+            self.assertEqual(
+                version_schema,
+                get_version_schema(new_dataset_metadata, version_metadata),
+            )
+            self.assertEqual(version_schema['labels'], {'label1': 'value1'})
+        self.assertEqual(version_schemas[1]['description'], 'version 2')
+
+        print('\nTest 4.2 ok')
+
+        print('4.3 recompute_version_schemas')
+        metadata_pairs = [
+            (new_dataset_metadata, version_metadata)
+            for version_metadata in version_list
+        ]
+        metadata_pairs += [(dataset_metadata, version_list[0])]
+        metadata_pairs += [
+            (new_dataset_metadata, version_metadata)
+            for version_metadata in version_list
+        ]
+        expected_schemas = [get_version_schema(*pair) for pair in metadata_pairs]
+        for processes in [1, 2]:
+            self.assertEqual(
+                list(
+                    recompute_version_schemas(
+                        iter(metadata_pairs), processes=processes, chunk_size=2
+                    )
+                ),
+                expected_schemas,
+            )
+        self.assertEqual(expected_schemas[3]['labels'], {})
+
+        # The tasks only hold the index of the dataset labels, which are
+        # found once for each run of the same dataset.
+        dataset_labels_list, tasks = _version_schema_tasks(metadata_pairs, 2)
+        self.assertEqual(len(dataset_labels_list), 3)
+        self.assertEqual(dataset_labels_list[1], [])
+        self.assertEqual(
+            [(index, len(versions)) for index, versions in tasks],
+            [(0, 2), (0, 1), (1, 1), (2, 2), (2, 1)],
+        )
+
+        print('\nTest 4.3 ok')
+
+        print('4.4 schema cache')
+        schema_cache.clear()
+        first_schema = get_version_schema(new_dataset_metadata, version_list[0])
+        first_schema['labels']['changed'] = 'by the caller'
+        second_schema = get_version_schema(
+            json.loads(json.dumps(new_dataset_metadata)), version_list[0]
+        )
+        self.assertEqual(second_schema, expected_schemas[0])
+        self.assertEqual(schema_cache.stats()['hits'], 1)
+        self.assertEqual(schema_cache.stats()['misses'], 1)
+
+        # The key is computed from the last annotation, whatever the
+        # checkpoint says, and it changes when an annotation is added.
+        key = metadata_key(new_dataset_metadata)
+        no_checkpoint = dict(new_dataset_metadata)
+        no_checkpoint.pop('checkpoint', None)
+        self.assertEqual(metadata_key(no_checkpoint), key)
+        stale_checkpoint = json.loads(json.dumps(new_dataset_metadata))
+        stale_checkpoint['annotations'][-1]['value'] = 'edited'
+        self.assertNotEqual(metadata_key(stale_checkpoint), key)
+        d_metadata = Metadata.from_trusted_dict(new_dataset_metadata)
+        d_metadata.add_annotation(LabelAnnotation(label='key', value='changed'))
+        self.assertNotEqual(metadata_key(d_metadata.to_dict(checkpoint=True)), key)
+
+        cache = SchemaCache(2)
+        for key in ['a', 'b', 'a', 'c']:
+            if cache.get(key) is None:
+                cache.put(key, {'key': key})
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), {'key': 'a'})
+        self.assertEqual(
+            cache.stats(),
+            {'hits': 2, 'misses': 4, 'evictions': 1, 'entries': 2, 'max_entries': 2},
+        )
+
+        print('\nTest 4.4 ok')
+
     def test_05_patch_version_metadata(self):
         print('5.1 patch_version_metadata')
 
@@ -486,6 +590,160 @@ class DataTierTestCase(unittest.TestCase):
 
         print('\nTest 8.1 ok')
 
+    def test_09_deltas(self):
+        print('9.1 patch deltas')
+        dataset_metadata, dummy = post_dataset_metadata(
+            'test dataset',
+            'dataset-0d7ce92a-50ff-42f4-9936-6ccf701938c1',
+            'description of the dataset',
+            'Fred',
+            labels=[{'type': 'LabelAnnotation', 'label': 'label1', 'value': 'v1'}],
+        )
+        new_dataset_metadata, dummy, delta = patch_dataset_metadata(
+            dataset_metadata,
+            with_delta=True,
+            labels=[{'type': 'LabelAnnotation', 'label': 'label2', 'value': 'v2'}],
+        )
+        self.assertEqual(
+            [(operation['op'], operation['path']) for operation in delta],
+            [('replace', '/last_updated'), ('add', '/labels/-')],
+        )
+        self.assertEqual(delta[1]['value'], new_dataset_metadata['labels'][1])
+        # The checkpoint is not in the delta, so the original one is kept, and
+        # it still matches the labels it was taken at.
+        applied = apply_delta(dataset_metadata, delta)
+        self.assertEqual(applied['checkpoint'], dataset_metadata['checkpoint'])
+        self.assertEqual(
+            {**applied, 'checkpoint': new_dataset_metadata['checkpoint']},
+            new_dataset_metadata,
+        )
+        self.assertEqual(
+            Metadata.from_trusted_dict(applied).get_json_schema(),
+            Metadata.from_trusted_dict(new_dataset_metadata).get_json_schema(),
+        )
+        self.assertEqual(len(dataset_metadata['labels']), 1)
+        print('\nTest 9.1 ok')
+
+        print('9.2 version and travelling deltas')
+        version_metadata, dummy = post_version_metadata(dataset_metadata, 1)
+        annotation = FieldsDescriptorAnnotation(
+            'Supplier', 'Fields', {'smiles': {'type': 'string'}}
+        )
+        new_version_metadata, dummy, delta = patch_version_metadata(
+            dataset_metadata,
+            version_metadata,
+            with_delta=True,
+            description='new description',
+            annotations=[annotation.to_dict()],
+        )
+        self.assertEqual(
+            sorted(operation['path'] for operation in delta),
+            ['/annotations/-', '/annotations/-', '/description', '/last_updated'],
+        )
+        self.assertEqual(
+            get_version_schema(dataset_metadata, apply_delta(version_metadata, delta)),
+            get_version_schema(dataset_metadata, new_version_metadata),
+        )
+
+        travelling_metadata, dummy = get_travelling_metadata(
+            new_dataset_metadata, new_version_metadata
+        )
+        new_travelling_metadata, dummy, delta = patch_travelling_metadata(
+            travelling_metadata, with_delta=True, description='travelling'
+        )
+        self.assertEqual(
+            apply_delta(travelling_metadata, delta), new_travelling_metadata
+        )
+        print('\nTest 9.2 ok')
+
+        print('9.3 create_delta and apply_delta')
+        original = {'a': 1, 'b/c': 2, 'annotations': [1, 2], 'labels': [1]}
+        updated = {'a': 1, 'd': [3], 'annotations': [1, 2, 3], 'labels': []}
+        delta = create_delta(original, updated)
+        self.assertEqual(
+            delta,
+            [
+                {'op': 'add', 'path': '/d', 'value': [3]},
+                {'op': 'add', 'path': '/annotations/-', 'value': 3},
+                {'op': 'replace', 'path': '/labels', 'value': []},
+                {'op': 'remove', 'path': '/b~1c'},
+            ],
+        )
+        self.assertEqual(apply_delta(original, delta), updated)
+        self.assertEqual(create_delta(updated, updated), [])
+
+        # A list whose entries have changed (e.g. compacted) is replaced even
+        # if it is no shorter, and the checkpoint is then removed.
+        original = {'annotations': [1, 2], 'checkpoint': {'annotation_count': 2}}
+        updated = {'annotations': [4, 3], 'checkpoint': {'annotation_count': 2}}
+        delta = create_delta(original, updated)
+        self.assertEqual(
+            delta,
+            [
+                {'op': 'replace', 'path': '/annotations', 'value': [4, 3]},
+                {'op': 'remove', 'path': '/checkpoint'},
+            ],
+        )
+        self.assertEqual(apply_delta(original, delta), {'annotations': [4, 3]})
+        updated = {'annotations': [1, 2, 3], 'checkpoint': {'annotation_count': 3}}
+        self.assertEqual(
+            create_delta(original, updated),
+            [{'op': 'add', 'path': '/annotations/-', 'value': 3}],
+        )
+        with self.assertRaises(ValueError):
+            apply_delta(original, [{'op': 'move', 'path': '/a', 'from': '/b'}])
+        print('\nTest 9.3 ok')
+
+    def test_10_lazy_imports(self):
+        print('10.1 imports')
+        # A new interpreter is needed, as this one has imported everything.
+        script = (
+            'import json, logging, sys\n'
+            'import data_manager_metadata.data_tier_api\n'
+            'print(json.dumps({\n'
+            '    "modules": sorted(sys.modules),\n'
+            '    "handlers": len(logging.getLogger("basic").handlers),\n'
+            '}))\n'
+        )
+        result = subprocess.run(
+            [sys.executable, '-c', script],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        imported = json.loads(result.stdout)
+        for module in ['yaml', 'multiprocessing']:
+            self.assertNotIn(module, imported['modules'])
+        self.assertEqual(imported['handlers'], 0)
+
+        # The modules are imported when they are used.
+        annotation = ServiceExecutionAnnotation(
+            service='a',
+            service_version='1',
+            service_user='bob',
+            service_name='b',
+            service_ref='c',
+            service_parameters={'x': 1},
+        )
+        self.assertEqual(annotation.parameters_to_yaml(), 'x: 1\n')
+        self.assertEqual(list(recompute_version_schemas([], processes=2)), [])
+        print('\nTest 10.1 ok')
+
+        print('10.2 package exports')
+        import data_manager_metadata
+        from data_manager_metadata import metadata
+
+        self.assertIs(data_manager_metadata.Metadata, metadata.Metadata)
+        self.assertIs(data_manager_metadata.schema_cache.SchemaCache, SchemaCache)
+        self.assertIn('Metadata', dir(data_manager_metadata))
+        with self.assertRaises(AttributeError):
+            data_manager_metadata.missing_name
+
+        logger = configure_basic_logger()
+        self.assertIs(configure_basic_logger(), logger)
+        self.assertEqual(len(logger.handlers), 1)
+        print('\nTest 10.2 ok')
+
     def test_20_smina_annotation_no_existing_metadata(self):
         print('20 smina annotation no existing metadata')
         proj_dir = 'test/output/api/20/'
@@ -550,9 +808,14 @@ class DataTierTestCase(unittest.TestCase):
             'debug': True,
         }
 
-        written_files = create_job_annotations(
-            proj_dir, job_application_spec, job_rendered_spec, 'testuser', False
-        )
+        # The results metadata is streamed to its file, and is not built as a
+        # whole dictionary (for example for a log message).
+        with mock.patch.object(
+            Metadata, 'to_dict', side_effect=AssertionError('to_dict() called')
+        ):
+            written_files = create_job_annotations(
+                proj_dir, job_application_spec, job_rendered_spec, 'testuser', False
+            )
 
         self.assertEqual(len(written_files), 2)
 
@@ -1,13 +1,30 @@
 import unittest
+import io
 import json
+import os
+import pickle
+import re
+import socket
+import stat
+import tempfile
+import threading
+import time
 from data_manager_metadata.metadata import (
     Metadata,
+    _is_trusted_row,
     LabelAnnotation,
     FieldsDescriptorAnnotation,
     ServiceExecutionAnnotation,
 )
 
 from data_manager_metadata.annotation_utils import est_schema_field_type
+from data_manager_metadata.validators import is_valid
+from data_manager_metadata import binary, codec
+from data_manager_metadata.json_stream import (
+    iter_annotations,
+    iter_metadata_items,
+    read_metadata,
+)
 from data_manager_metadata.exceptions import (
     ANNOTATION_ERRORS,
     AnnotationValidationError,
@@ -728,6 +745,663 @@ class MetadataTestCase(unittest.TestCase):
 
         print('\nTest 11 ok')
 
+    def test_12_compiled_fields_state(self):
+        print('\n12. Test compiled fields are maintained as annotations are added')
+        metadata = Metadata('Dataset 1', '0000-1111', '', 'Tom')
+        with open('test/input/test1.annotations', "r", encoding='utf8') as anno_file:
+            metadata.add_annotations(json.load(anno_file))
+        with open('test/input/test2.annotations', "r", encoding='utf8') as anno_file_2:
+            metadata.add_annotations(json.load(anno_file_2))
+        fields = metadata.get_compiled_fields()
+        self.assertEqual(list(fields['fields']), ['molecule', 'uuid', 'smiles'])
+
+        # Changing the returned fields must not change the compiled fields.
+        fields['fields']['smiles']['type'] = 'number'
+        schema = metadata.get_json_schema()
+        self.assertEqual(schema['fields']['smiles']['type'], 'string')
+
+        # The reloaded metadata compiles the same fields.
+        reload_metadata = Metadata(**json.loads(metadata.to_json()))
+        self.assertEqual(reload_metadata.get_json_schema(), schema)
+        print('\nTest 12 ok')
+
+    def test_13_label_types(self):
+        print('\n13. Test latest labels filtered by label type')
+        metadata = Metadata('Dataset 1', '0000-1111', '', 'Tom')
+        metadata.add_labels(
+            [
+                {'type': 'LabelAnnotation', 'label': 'plain1', 'value': 'v1'},
+                {'type': 'LabelAnnotation', 'label': '#hash1', 'value': 'v1'},
+                {'type': 'LabelAnnotation', 'label': '@addr1', 'value': 'v1'},
+                {'type': 'LabelAnnotation', 'label': 'plain1', 'value': 'v2'},
+                {'type': 'LabelAnnotation', 'label': '#hash1', 'active': False},
+            ]
+        )
+        self.assertEqual(
+            [label['label'] for label in metadata.get_labels()],
+            ['#hash1', 'plain1', '@addr1'],
+        )
+        self.assertEqual(
+            metadata.get_labels(labels_only=True, label_type='plain'),
+            {'plain1': 'v2'},
+        )
+        self.assertEqual(
+            metadata.get_labels(active=True, labels_only=True, label_type='hash'), {}
+        )
+        self.assertEqual(
+            metadata.get_labels(labels_only=True, label_type='address'),
+            {'@addr1': 'v1'},
+        )
+
+        # Plain labels applied before the synchronised datetime are not
+        # transferred to a new dataset.
+        labels = metadata.get_labels_new_dataset('2999-01-01T00:00:00.000000')
+        self.assertEqual([label['label'] for label in labels], ['@addr1'])
+        print('\nTest 13 ok')
+
+    def test_14_changed_since(self):
+        print('\n14. Test annotations and labels created since a datetime')
+        metadata = Metadata('Dataset 1', '0000-1111', '', 'Tom')
+        metadata.add_annotations(
+            [
+                {
+                    'type': 'PropertyChangeAnnotation',
+                    'created': '2021-01-03T00:00:00.000000',
+                    'meta_property': 'description',
+                    'previous_value': 'third',
+                },
+                {
+                    'type': 'PropertyChangeAnnotation',
+                    'created': '2021-01-01T00:00:00.000000',
+                    'meta_property': 'description',
+                    'previous_value': 'first',
+                },
+            ]
+        )
+        metadata.add_labels(
+            [
+                {
+                    'type': 'LabelAnnotation',
+                    'created': '2021-01-02T00:00:00.000000',
+                    'label': 'label1',
+                },
+                {
+                    'type': 'LabelAnnotation',
+                    'created': '2021-01-04T00:00:00.000000',
+                    'label': 'label2',
+                },
+            ]
+        )
+        annotations = metadata.annotations_since('2020-12-31T00:00:00')
+        self.assertEqual(
+            [anno.previous_value for anno in annotations], ['first', 'third']
+        )
+        annotations = metadata.annotations_since('2021-01-01T00:00:00')
+        self.assertEqual([anno.previous_value for anno in annotations], ['third'])
+        labels = metadata.get_labels_existing_dataset('2021-01-02T00:00:00.000000')
+        self.assertEqual([label['label'] for label in labels], ['label2'])
+        self.assertEqual(len(metadata.labels_since('2021-01-05T00:00:00')), 0)
+
+        # Labels are returned in the order they were added, which decides the
+        # latest label when they have the same created time or are out of order.
+        metadata.add_labels(
+            [
+                {
+                    'type': 'LabelAnnotation',
+                    'created': '2021-01-06T00:00:00.000000',
+                    'label': 'label3',
+                    'value': 'second',
+                },
+                {
+                    'type': 'LabelAnnotation',
+                    'created': '2021-01-05T00:00:00.000000',
+                    'label': 'label3',
+                    'value': 'third',
+                },
+                {
+                    'type': 'LabelAnnotation',
+                    'created': '2021-01-05T00:00:00.000000',
+                    'label': 'label3',
+                    'value': 'fourth',
+                },
+            ]
+        )
+        labels = metadata.labels_since('2021-01-04T00:00:00')
+        self.assertEqual(
+            [label.get_value() for label in labels], ['second', 'third', 'fourth']
+        )
+        latest = metadata.get_labels(labels_only=True)
+        self.assertEqual(latest['label3'], labels[-1].get_value())
+        print('\nTest 14 ok')
+
+    def test_15_validators(self):
+        print('\n15. Test compiled validators match the ANNOTATION_ERRORS regex')
+        for value in [
+            '',
+            '\n',
+            'x' * 255,
+            'x' * 255 + '\n',
+            'x' * 256,
+            'x\ny',
+            'xy\n\n',
+            'x' * 5000,
+        ]:
+            self.assertEqual(
+                is_valid('LabelAnnotation', '2', value),
+                re.match(ANNOTATION_ERRORS['LabelAnnotation']['2']['regex'], value)
+                is not None,
+            )
+        self.assertTrue(is_valid('LabelAnnotation', '1', '#label_1'))
+        self.assertFalse(is_valid('LabelAnnotation', '1', 'label-1'))
+        self.assertFalse(is_valid('LabelAnnotation', '1', 'l' * 1000))
+        self.assertFalse(is_valid('ServiceExecutionAnnotation', '1', ''))
+        self.assertTrue(is_valid('FieldsDescriptorAnnotation', '4', 'integer'))
+        self.assertFalse(is_valid('FieldsDescriptorAnnotation', '4', 'blob'))
+        print('\nTest 15 ok')
+
+    def test_16_trusted_metadata(self):
+        print('\n16. Test metadata created from a trusted dictionary')
+        metadata_dict = json.loads(self.metadata.to_json())
+        trusted_metadata = Metadata.from_trusted_dict(metadata_dict)
+        self.assertEqual(trusted_metadata.to_json(), self.metadata.to_json())
+        self.assertEqual(
+            trusted_metadata.get_json_schema(), self.metadata.get_json_schema()
+        )
+        self.assertEqual(
+            trusted_metadata.get_labels(), Metadata(**metadata_dict).get_labels()
+        )
+
+        # Trusted annotations are not validated again.
+        invalid_label = LabelAnnotation('label1').to_dict()
+        invalid_label['value'] = 'x' * 256
+        metadata_dict['labels'].append(invalid_label)
+        trusted_metadata = Metadata.from_trusted_dict(metadata_dict)
+        self.assertEqual(
+            trusted_metadata.get_labels(labels_only=True)['label1'], 'x' * 256
+        )
+
+        # Older annotations and metadata are still validated.
+        invalid_label['annotation_version'] = '0.0.0'
+        with self.assertRaises(AnnotationValidationError):
+            Metadata.from_trusted_dict(metadata_dict)
+        invalid_label['annotation_version'] = '0.0.1'
+        metadata_dict['metadata_version'] = '0.0.0'
+        with self.assertRaises(AnnotationValidationError):
+            Metadata.from_trusted_dict(metadata_dict)
+
+        # Nested fields and parameters with the wrong shape are not trusted.
+        class_lookup = {'FieldsDescriptorAnnotation': FieldsDescriptorAnnotation}
+        row = FieldsDescriptorAnnotation(
+            'origin', 'description', {'x': {'type': 'string', 'description': 'x'}}
+        ).to_dict()
+        self.assertTrue(_is_trusted_row(row, class_lookup))
+        for key, value in [('type', 5), ('required', 'yes'), ('active', None)]:
+            bad_row = json.loads(json.dumps(row))
+            bad_row['fields']['x'][key] = value
+            self.assertFalse(_is_trusted_row(bad_row, class_lookup))
+        bad_row['fields'] = ['x']
+        self.assertFalse(_is_trusted_row(bad_row, class_lookup))
+        print('\nTest 16 ok')
+
+    def test_17_lazy_annotations(self):
+        print('\n17. Test trusted annotations are created when needed')
+        metadata_dict = json.loads(self.metadata.to_json())
+        trusted_metadata = Metadata.from_trusted_dict(metadata_dict)
+        # Only the annotations that are needed are created and untouched
+        # annotations are passed straight through.
+        annotation = trusted_metadata.get_annotation(0)
+        self.assertEqual(annotation.to_dict(), metadata_dict['annotations'][0])
+        trusted_dict = trusted_metadata.to_dict()
+        self.assertIsNot(
+            trusted_dict['annotations'][0], metadata_dict['annotations'][0]
+        )
+        self.assertIs(trusted_dict['annotations'][1], metadata_dict['annotations'][1])
+        self.assertIs(trusted_dict['labels'][0], metadata_dict['labels'][0])
+        self.assertEqual(
+            [anno.to_dict() for anno in trusted_metadata.annotations],
+            metadata_dict['annotations'],
+        )
+        self.assertEqual(
+            [label.to_dict() for label in trusted_metadata.labels_since('2000-01-01')],
+            [label.to_dict() for label in self.metadata.labels_since('2000-01-01')],
+        )
+        self.assertEqual(trusted_metadata.to_json(), self.metadata.to_json())
+        print('\nTest 17 ok')
+
+    def test_18_memoised_dict(self):
+        print('\n18. Test the dictionary and JSON are memoised until a change')
+        metadata = Metadata.from_trusted_dict(json.loads(self.metadata.to_json()))
+        metadata_dict = metadata.to_dict()
+        metadata_json = metadata.to_json()
+        self.assertIs(metadata.to_dict(), metadata_dict)
+        self.assertIs(metadata.to_json(), metadata_json)
+
+        metadata.add_label(LabelAnnotation('label99', 'new'))
+        self.assertIsNot(metadata.to_dict(), metadata_dict)
+        self.assertEqual(metadata.to_dict()['labels'][-1]['label'], 'label99')
+        self.assertEqual(json.loads(metadata.to_json()), metadata.to_dict())
+        metadata.set_description('New description')
+        self.assertEqual(
+            json.loads(metadata.to_json())['description'], 'New description'
+        )
+
+        # Changing an annotation discards its dictionary.
+        annotation = FieldsDescriptorAnnotation('origin', 'description')
+        annotation_dict = annotation.to_dict()
+        self.assertIs(annotation.to_dict(), annotation_dict)
+        annotation.add_field('smiles', True, 'string', 'Smiles')
+        self.assertIn('smiles', annotation.to_dict()['fields'])
+        annotation.set_description('Changed')
+        self.assertEqual(annotation.to_dict()['description'], 'Changed')
+
+        # The memoised forms and lazily built indexes are not pickled. (The
+        # annotations are created first, as they pickle differently from the
+        # trusted dictionaries they are created from.)
+        self.assertTrue(metadata.annotations and metadata.labels)
+        pickled = pickle.dumps(metadata)
+        metadata.to_json()
+        metadata.get_json_schema()
+        metadata.fingerprint()
+        self.assertEqual(len(pickle.dumps(metadata)), len(pickled))
+        reloaded = pickle.loads(pickle.dumps(metadata))
+        self.assertIsNone(reloaded._json)
+        self.assertEqual(reloaded.to_json(), metadata.to_json())
+        self.assertEqual(reloaded.fingerprint(), metadata.fingerprint())
+        self.assertEqual(reloaded.get_json_schema(), metadata.get_json_schema())
+        self.assertEqual(
+            pickle.loads(pickle.dumps(annotation)).to_dict(), annotation.to_dict()
+        )
+        print('\nTest 18 ok')
+
+    def test_19_write_json(self):
+        print('\n19. Test the streaming JSON writer')
+        metadata_json = self.metadata.to_json()
+        for metadata in (
+            Metadata.from_trusted_dict(json.loads(metadata_json)),
+            Metadata(**json.loads(metadata_json)),
+            Metadata('dataset', 'uuid', 'description', 'user'),
+        ):
+            json_file = io.StringIO()
+            metadata.write_json(json_file)
+            self.assertEqual(json_file.getvalue(), metadata.to_json())
+        print('\nTest 19 ok')
+
+    def test_21_json_stream(self):
+        print('\n21. Test the incremental JSON reader')
+        metadata_json = self.metadata.to_json()
+        annotations_json = json.dumps(self.metadata.get_annotations_dict())
+        for chunk_size in [1, 7, 100, 65536]:
+            for trusted in [False, True]:
+                metadata = read_metadata(
+                    io.StringIO(metadata_json), trusted, chunk_size
+                )
+                self.assertEqual(metadata.to_json(), metadata_json)
+            self.assertEqual(
+                list(iter_annotations(io.StringIO(annotations_json), chunk_size)),
+                json.loads(annotations_json),
+            )
+
+        # Whitespace and numbers split across chunks are handled.
+        rows = list(iter_annotations(io.StringIO(' [ 12345 , {"a" : [1, 2]} ]\n'), 2))
+        self.assertEqual(rows, [12345, {'a': [1, 2]}])
+        self.assertEqual(list(iter_annotations(io.StringIO('[]'))), [])
+        # Every chunk boundary gives the same values, including boundaries
+        # inside numbers.
+        for doc in [
+            '[1.5, 2]',
+            '[1.5e10, 2]',
+            '[-12.25E-3,{"a": [1e+2, -0.5]}, 10, true, null, "x,1"]',
+            '{"a": 1.5}\n{"b": -2e3}\n3.25\n',
+        ]:
+            expected = list(iter_annotations(io.StringIO(doc), len(doc)))
+            for chunk_size in range(1, len(doc) + 1):
+                self.assertEqual(
+                    list(iter_annotations(io.StringIO(doc), chunk_size)), expected
+                )
+        metadata_json = json.dumps({'dataset_name': 'x', 'dataset_version': 12.5})
+        for chunk_size in range(1, len(metadata_json) + 1):
+            self.assertEqual(
+                dict(iter_metadata_items(io.StringIO(metadata_json), chunk_size)),
+                json.loads(metadata_json),
+            )
+        for bad_json in ['[1, 2', '[1 2]', '[1]]', '{"a": 1']:
+            with self.assertRaises(json.JSONDecodeError):
+                list(iter_annotations(io.StringIO(bad_json), 2))
+        print('\nTest 21 ok')
+
+    def test_22_codec(self):
+        print('\n22. Test the JSON codec matches the json module')
+        metadata_json = self.metadata.to_json()
+        self.assertEqual(codec.dumps(self.metadata.to_dict()), metadata_json)
+        self.assertEqual(codec.loads(metadata_json), json.loads(metadata_json))
+        self.assertEqual(
+            codec.load(io.StringIO(metadata_json)), json.loads(metadata_json)
+        )
+        for text in ['[1e400, NaN]', '["\\ud800"]', '[12345678901234567890123]']:
+            self.assertEqual(repr(codec.loads(text)), repr(json.loads(text)))
+        for text in ['[1,]', '{"a": 1', '']:
+            with self.assertRaises(json.JSONDecodeError):
+                codec.loads(text)
+        print('\nTest 22 ok')
+
+    def test_23_binary(self):
+        print('\n23. Test the binary format round trips')
+        metadata_bytes = self.metadata.to_bytes()
+        self.assertLess(len(metadata_bytes), len(self.metadata.to_json()))
+        self.assertEqual(
+            Metadata.from_bytes(metadata_bytes).to_json(), self.metadata.to_json()
+        )
+
+        # Anything that is not a timestamp isoformat() writes is kept as it is.
+        metadata_dict = json.loads(self.metadata.to_json())
+        metadata_dict['created'] = '2022-01-01T00:00:00.000000'
+        metadata_dict['last_updated'] = '2022-01-01T00:00:00'
+        metadata_dict['annotations'][0]['created'] = '2022-01-01 00:00:00.123456'
+        metadata_dict['annotations'][1]['created'] = 1
+        del metadata_dict['annotations'][2]['created']
+        metadata_dict['labels'] = []
+        metadata_dict['extra'] = [{'created': 1.5, 'big': 10**30}, None]
+        round_trip = binary.dict_from_bytes(binary.dict_to_bytes(metadata_dict))
+        self.assertEqual(json.dumps(round_trip), json.dumps(metadata_dict))
+
+        # The arrays are little-endian whatever the byte order of the host.
+        created = '2022-01-01T00:00:00.000001'
+        microseconds = 1640995200000001
+        data = binary.dict_to_bytes(
+            {'annotations': [{'created': created}, {}] + [{'created': created}] * 3}
+        )
+        self.assertIn(microseconds.to_bytes(8, 'little') * 4, data)
+        shapes = [0, 1, 0, 0, 0]
+        self.assertIn(b''.join(shape.to_bytes(4, 'little') for shape in shapes), data)
+        swap_bytes = binary._SWAP_BYTES
+        try:
+            # As written and read on a host with the other byte order.
+            binary._SWAP_BYTES = not swap_bytes
+            swapped_data = binary.dict_to_bytes(metadata_dict)
+            self.assertEqual(
+                json.dumps(binary.dict_from_bytes(swapped_data)),
+                json.dumps(metadata_dict),
+            )
+        finally:
+            binary._SWAP_BYTES = swap_bytes
+
+        # Columns that are all strings share the string table.
+        strings = {'annotations': [{'a': 'x', 'b': 'y'}, {'a': 'y', 'b': 'x'}] * 2}
+        data = binary.dict_to_bytes(strings)
+        self.assertEqual(data.count(b'x'), 1)
+        self.assertEqual(binary.dict_from_bytes(data), strings)
+
+        # A list that is not all annotation dictionaries is kept as it is.
+        metadata_dict['labels'] = [{'label': 'a'}, 'b']
+        round_trip = binary.dict_from_bytes(binary.dict_to_bytes(metadata_dict))
+        self.assertEqual(json.dumps(round_trip), json.dumps(metadata_dict))
+
+        self.assertEqual(metadata_bytes[:5], b'DMMD' + bytes([2]))
+        with self.assertRaises(ValueError):
+            binary.dict_from_bytes(metadata_bytes[1:])
+        with self.assertRaises(ValueError):
+            binary.dict_from_bytes(b'DMMD' + bytes([99]) + metadata_bytes[5:])
+        with self.assertRaises(ValueError):
+            binary.dict_from_bytes(metadata_bytes[:-1])
+
+        # Version 1 data (with a marshal body) can still be read, unless it was
+        # written with a later marshal version than the interpreter has.
+        with open('test/input/metadata-v1.bin', 'rb') as binary_file:
+            version_1_bytes = binary_file.read()
+        self.assertEqual(
+            binary.dict_from_bytes(version_1_bytes)['annotations'][0]['created'],
+            '2022-01-02T00:00:00.000002',
+        )
+        with self.assertRaisesRegex(ValueError, 'marshal version 99'):
+            binary.dict_from_bytes(b'DMMD' + bytes([1, 99]) + version_1_bytes[6:])
+        print('\nTest 23 ok')
+
+    def test_24_interned_strings(self):
+        print('\n24. Test repeated annotation strings are interned')
+        metadata_json = self.metadata.to_json()
+        first = Metadata(**json.loads(metadata_json))
+        second = Metadata(**json.loads(metadata_json))
+        for first_anno, second_anno in zip(first.annotations, second.annotations):
+            if isinstance(first_anno, FieldsDescriptorAnnotation):
+                self.assertIs(first_anno.origin, second_anno.origin)
+                for first_name, second_name in zip(
+                    first_anno.fields, second_anno.fields
+                ):
+                    self.assertIs(first_name, second_name)
+                    self.assertIs(
+                        first_anno.fields[first_name].description,
+                        second_anno.fields[second_name].description,
+                    )
+        self.assertIs(first.labels[0].label, second.labels[0].label)
+        print('\nTest 24 ok')
+
+    def test_25_annotation_ids(self):
+        print('\n25. Test annotation identities and duplicate annotations')
+        metadata_dict = self.metadata.to_dict()
+        trusted = Metadata.from_trusted_dict(metadata_dict)
+        for pos, annotation in enumerate(self.metadata.annotations):
+            annotation_id = annotation.get_id()
+            self.assertEqual(len(annotation_id), 64)
+            self.assertNotIn('id', annotation.to_dict())
+            self.assertEqual(
+                trusted.get_annotation_by_id(annotation_id).to_dict(),
+                metadata_dict['annotations'][pos],
+            )
+        self.assertIsNone(trusted.get_annotation_by_id('0' * 64))
+
+        # Adding the same annotations again adds nothing.
+        last_updated = trusted.last_updated
+        trusted.add_annotations(json.loads(json.dumps(metadata_dict['annotations'])))
+        self.assertEqual(trusted.to_dict(), metadata_dict)
+        self.assertEqual(trusted.last_updated, last_updated)
+
+        # A new annotation is added once.
+        new_annotation = FieldsDescriptorAnnotation('Supplier 2', 'New fields', {})
+        new_dict = new_annotation.to_dict()
+        trusted.add_annotations([new_dict, new_dict])
+        self.assertEqual(
+            len(trusted.get_annotations_dict()), len(metadata_dict['annotations']) + 1
+        )
+        self.assertEqual(
+            trusted.get_annotation_by_id(new_annotation.get_id()).to_dict(), new_dict
+        )
+
+        # New annotations created after all the others are added without
+        # building the identity index, from a checkpoint or the created times.
+        checkpoint_dict = json.loads(json.dumps(trusted.to_dict(checkpoint=True)))
+        for loaded_dict in [checkpoint_dict, trusted.to_dict()]:
+            loaded = Metadata.from_trusted_dict(loaded_dict)
+            newer_dict = FieldsDescriptorAnnotation('Supplier 3', 'Newer', {}).to_dict()
+            loaded.add_annotations([newer_dict])
+            self.assertIsNone(loaded._annotation_ids)
+            self.assertEqual(len(loaded.annotations), len(trusted.annotations) + 1)
+            # A duplicate still uses the index.
+            loaded.add_annotations([newer_dict, new_dict])
+            self.assertIsNotNone(loaded._annotation_ids)
+            self.assertEqual(len(loaded.annotations), len(trusted.annotations) + 1)
+        print('\nTest 25 ok')
+
+    def test_26_compact(self):
+        print('\n26. Test compacting the annotation and label history')
+        metadata = Metadata('compact', '0000-2222', 'first', 'Bob')
+        for pos in range(3):
+            metadata.set_description('description %d' % pos)
+            metadata.add_annotation(
+                FieldsDescriptorAnnotation(
+                    'Supplier',
+                    'Fields %d' % pos,
+                    {
+                        'smiles': {'type': 'string', 'description': 'smiles %d' % pos},
+                        'field%d' % pos: {'type': 'number', 'active': pos != 1},
+                    },
+                )
+            )
+            metadata.add_label(LabelAnnotation('label1', 'value %d' % pos))
+            metadata.add_label(LabelAnnotation('#label%d' % pos, 'value'))
+        metadata.add_label(LabelAnnotation('label1', active=False))
+        since = metadata.get_annotation(len(metadata.annotations) - 1).created
+        metadata.set_created_by('Dick')
+
+        schema = metadata.get_json_schema()
+        compiled_fields = metadata.get_compiled_fields()['fields']
+        labels = metadata.get_labels()
+        metadata_dict = metadata.to_dict()
+
+        archive = metadata.compact(since)
+        compacted_dict = metadata.to_dict()
+        self.assertEqual(
+            len(archive['annotations']) + 1, len(metadata_dict['annotations'])
+        )
+        self.assertEqual(len(compacted_dict['annotations']), 2)
+        self.assertEqual(
+            compacted_dict['annotations'][1]['type'], 'PropertyChangeAnnotation'
+        )
+        # The superseded label1 created after since is kept.
+        self.assertEqual(len(compacted_dict['labels']), 5)
+        self.assertEqual(len(archive['labels']) + 5, len(metadata_dict['labels']))
+        for compacted in [metadata, Metadata(**json.loads(metadata.to_json()))]:
+            self.assertEqual(compacted.get_json_schema(), schema)
+            self.assertEqual(compacted.get_compiled_fields()['fields'], compiled_fields)
+            self.assertEqual(compacted.get_labels(), labels)
+
+        # Compacting everything leaves only the compiled fields.
+        metadata.compact()
+        self.assertEqual(len(metadata.get_annotations_dict()), 1)
+        self.assertEqual(metadata.get_json_schema(), schema)
+        self.assertEqual(metadata.compact(), {'annotations': [], 'labels': []})
+        print('\nTest 26 ok')
+
+    def test_27_checkpoint(self):
+        print('\n27. Test loading metadata from a checkpoint')
+        schema = self.metadata.get_json_schema()
+        labels = self.metadata.get_labels()
+        metadata_dict = self.metadata.to_dict(checkpoint=True)
+        checkpoint = metadata_dict['checkpoint']
+        self.assertNotIn('checkpoint', self.metadata.to_dict())
+        self.assertEqual(checkpoint['annotation_count'], len(self.metadata.annotations))
+        self.assertEqual(checkpoint['label_count'], len(self.metadata.labels))
+
+        metadata_json = self.metadata.to_json(checkpoint=True)
+        json_file = io.StringIO()
+        self.metadata.write_json(json_file, checkpoint=True)
+        self.assertEqual(json_file.getvalue(), metadata_json)
+
+        for loaded in [
+            Metadata(**json.loads(metadata_json)),
+            Metadata.from_trusted_dict(json.loads(metadata_json)),
+            read_metadata(io.StringIO(metadata_json), trusted=True),
+        ]:
+            self.assertEqual(loaded.get_json_schema(), schema)
+            self.assertEqual(loaded.get_labels(), labels)
+            self.assertEqual(loaded.to_dict(), self.metadata.to_dict())
+
+        # The checkpoint is used rather than replaying the annotations, and
+        # annotations added later are compiled after it.
+        metadata_dict = json.loads(metadata_json)
+        metadata_dict['checkpoint']['fields'] = [
+            ['checkpoint', {'type': 'string', 'description': 'From the checkpoint'}]
+        ]
+        loaded = Metadata.from_trusted_dict(metadata_dict)
+        loaded.add_annotation(
+            FieldsDescriptorAnnotation(
+                'Supplier', 'Later', {'later': {'type': 'number'}}
+            )
+        )
+        self.assertEqual(
+            list(loaded.get_compiled_fields()['fields']), ['checkpoint', 'later']
+        )
+
+        # The labels and fields keep their order when a store reorders the
+        # keys of the checkpoint objects, and fields held in an object (whose
+        # order cannot be relied on) are ignored.
+        metadata_dict = json.loads(metadata_json)
+        checkpoint = metadata_dict['checkpoint']
+        self.assertGreater(len(checkpoint['latest_labels']), 1)
+        checkpoint['latest_labels'] = dict(
+            reversed(list(checkpoint['latest_labels'].items()))
+        )
+        loaded = Metadata.from_trusted_dict(metadata_dict)
+        self.assertEqual(loaded.get_labels(), labels)
+        self.assertEqual(loaded.get_json_schema(), schema)
+        checkpoint['fields'] = {'checkpoint': {'type': 'string'}}
+        loaded = Metadata.from_trusted_dict(metadata_dict)
+        self.assertEqual(loaded.get_json_schema(), schema)
+
+        # A checkpoint that does not match the annotations is ignored.
+        metadata_dict = json.loads(metadata_json)
+        metadata_dict['checkpoint']['fields'] = []
+        metadata_dict['checkpoint']['annotation_id'] = '0' * 64
+        metadata_dict['checkpoint']['latest_labels'] = {}
+        metadata_dict['checkpoint']['label_count'] = len(metadata_dict['labels']) + 1
+        loaded = Metadata.from_trusted_dict(metadata_dict)
+        self.assertEqual(loaded.get_json_schema(), schema)
+        self.assertEqual(loaded.get_labels(), labels)
+        print('\nTest 27 ok')
+
+    def test_28_fingerprint(self):
+        print('\n28. Test the metadata fingerprint and canonical JSON')
+        metadata_json = self.metadata.to_json()
+        metadata = Metadata.from_trusted_dict(json.loads(metadata_json))
+        fingerprint = metadata.fingerprint()
+        canonical_json = metadata.to_canonical_json()
+        self.assertEqual(self.metadata.fingerprint(), fingerprint)
+        self.assertEqual(
+            Metadata(**json.loads(metadata_json)).fingerprint(), fingerprint
+        )
+        self.assertEqual(self.metadata.to_canonical_json(), canonical_json)
+        self.assertEqual(
+            codec.canonical_dumps(json.loads(canonical_json)), canonical_json
+        )
+
+        # The fingerprint is updated as the metadata changes, and is the same
+        # as the fingerprint of the changed metadata when it is loaded again.
+        fingerprints = {fingerprint}
+        metadata.set_description('fingerprint')
+        fingerprints.add(metadata.fingerprint())
+        metadata.add_annotation(FieldsDescriptorAnnotation('Supplier', 'Fingerprint'))
+        fingerprints.add(metadata.fingerprint())
+        metadata.add_label(LabelAnnotation('fingerprint', 'value'))
+        fingerprints.add(metadata.fingerprint())
+        self.assertEqual(len(fingerprints), 4)
+        self.assertEqual(
+            Metadata.from_trusted_dict(json.loads(metadata.to_json())).fingerprint(),
+            metadata.fingerprint(),
+        )
+
+        # Datetimes are always written with microseconds, so the fingerprint
+        # does not change when an annotation with no microseconds is created
+        # from its trusted dictionary and isoformat() leaves them out.
+        metadata_dict = json.loads(metadata_json)
+        metadata_dict['annotations'][0]['created'] = '2022-05-04T12:00:00.000000'
+        metadata = Metadata.from_trusted_dict(metadata_dict)
+        fingerprint = metadata.fingerprint()
+        canonical_json = metadata.to_canonical_json()
+        self.assertEqual(
+            metadata.get_annotation(0).to_dict()['created'], '2022-05-04T12:00:00'
+        )
+        self.assertEqual(Metadata(**metadata.to_dict()).fingerprint(), fingerprint)
+        self.assertEqual(metadata.to_canonical_json(), canonical_json)
+        self.assertNotIn('12:00:00"', canonical_json)
+        print('\nTest 28 ok')
+
+    def test_29_json_lines(self):
+        print('\n29. Test annotations files in JSON Lines form')
+        rows = self.metadata.get_annotations_dict()
+        array_json = json.dumps(rows)
+        json_lines = ''.join(json.dumps(row) + '\n' for row in rows)
+        for text in [array_json, json_lines, json_lines.rstrip('\n')]:
+            for chunk_size in [1, 7, 65536]:
+                self.assertEqual(
+                    list(iter_annotations(io.StringIO(text), chunk_size)), rows
+                )
+
+        # A single annotation, on one line or over several, is read as a list.
+        for text in [json.dumps(rows[0]), json.dumps(rows[0], indent=4)]:
+            self.assertEqual(list(iter_annotations(io.StringIO(text))), [rows[0]])
+        self.assertEqual(list(iter_annotations(io.StringIO(''))), [])
+        self.assertEqual(list(iter_annotations(io.StringIO('\n'))), [])
+        print('\nTest 29 ok')
+
     def test_20_annotation_utilities(self):
         print('\n20. Tests for field types')
         self.assertEqual(est_schema_field_type('1'), 'integer')
@@ -742,7 +1416,250 @@ class MetadataTestCase(unittest.TestCase):
         print('\nTest 20 ok')
 
     def test_30_md_manage(self):
-        print('\n30. Tests for md_manage.py to be added')
+        print('\n30. Test a batch of md_manage.py commands')
+        import md_manage
+
+        with tempfile.TemporaryDirectory() as out_dir:
+            results = os.path.join(out_dir, 'results.sdf')
+            other_results = os.path.join(out_dir, 'more', 'other.sdf')
+            specs = [
+                '# Comments and blank lines are skipped',
+                'lb %s label1 -lv=value1' % results,
+                '',
+                'fd %s -fo=origin -fd="A description" -fp=%s'
+                % (results, 'score,number,Score,true,true'),
+                'lb %s label2 --json-lines' % other_results,
+                'se %s -su=bob -sys=run-smina -sy=test/input/virtual-screening.yaml'
+                ' -sp param1=val1 -fo=origin -fd=smina' % results,
+            ]
+            counts = md_manage.run_batch(io.StringIO('\n'.join(specs)))
+            anno_file = os.path.join(out_dir, 'results.sdf.annotations')
+            other_anno_file = os.path.join(out_dir, 'more', 'other.sdf.annotations')
+            self.assertEqual(counts, {anno_file: 3, other_anno_file: 1})
+
+            with open(anno_file, 'rt') as annotations:
+                self.assertEqual(annotations.read(1), '[')
+                annotations.seek(0)
+                rows = list(iter_annotations(annotations))
+            self.assertEqual(
+                [row['type'] for row in rows],
+                [
+                    'LabelAnnotation',
+                    'FieldsDescriptorAnnotation',
+                    'ServiceExecutionAnnotation',
+                ],
+            )
+            self.assertEqual(rows[1]['fields']['score']['type'], 'number')
+            self.assertEqual(rows[2]['service_parameters']['param1'], 'val1')
+            self.assertEqual(rows[2]['service'], 'run-smina')
+
+            # The second run adds to the files, and the JSON Lines file is appended to.
+            md_manage.run_batch(io.StringIO(specs[1] + '\n' + specs[4]))
+            with open(anno_file, 'rt') as annotations:
+                self.assertEqual(len(list(iter_annotations(annotations))), 4)
+            with open(other_anno_file, 'rt') as annotations:
+                lines = annotations.read().splitlines()
+            self.assertEqual(
+                [json.loads(line)['label'] for line in lines], ['label2'] * 2
+            )
+
+            # A bad command writes nothing.
+            with self.assertRaises(md_manage.CommandError) as context:
+                md_manage.run_batch(io.StringIO(specs[1] + '\nlb %s' % results))
+            self.assertIn('Batch line 2', str(context.exception))
+            with open(anno_file, 'rt') as annotations:
+                self.assertEqual(len(list(iter_annotations(annotations))), 4)
+
+            # Only the start of a file is read to tell if it is JSON Lines.
+            sniff_file = os.path.join(out_dir, 'sniff.annotations')
+            long_row = {'label': 'long', 'value': 'x' * md_manage._SNIFF_SIZE}
+            for text, is_json_lines in [
+                ('', False),
+                ('[{"label": "a"}]', False),
+                ('{\n  "label": "a"\n}\n', False),
+                ('  {"label": "a"}', True),
+                ('{"label": "a"}\n{"label": "b"}\n', True),
+                (json.dumps(long_row) + '\n', True),
+            ]:
+                with open(sniff_file, 'wt') as annotations:
+                    annotations.write(text)
+                self.assertEqual(md_manage._is_json_lines(sniff_file), is_json_lines)
+
+            # A changed yaml file is parsed again and replaces its cache entry.
+            yaml_file = os.path.join(out_dir, 'job.yaml')
+            for mtime, value in [(1000, 'one'), (2000, 'two')]:
+                with open(yaml_file, 'wt') as job:
+                    job.write('name: %s\n' % value)
+                os.utime(yaml_file, (mtime, mtime))
+                for _ in range(2):
+                    self.assertEqual(md_manage._load_yaml(yaml_file), {'name': value})
+            self.assertEqual(
+                [key for key in md_manage._YAML_CACHE if key.startswith(out_dir)],
+                [os.path.abspath(yaml_file)],
+            )
+        print('\nTest 30 ok')
+
+    def test_31_md_manage_server(self):
+        print('\n31. Test the md_manage.py annotation server')
+        import md_manage
+
+        with tempfile.TemporaryDirectory() as out_dir:
+            socket_path = os.path.join(out_dir, 'md.sock')
+            results = os.path.join(out_dir, 'results.sdf')
+            anno_file = results + '.annotations'
+            server = md_manage.AnnotationServer(socket_path, flush_interval=0.05)
+            thread = threading.Thread(target=server.serve_forever)
+            thread.start()
+            try:
+                for _ in range(100):
+                    if os.path.exists(socket_path):
+                        break
+                    time.sleep(0.01)
+                se_line = (
+                    'se %s -su=bob -sys=run-smina -sy=test/input/virtual-screening.yaml'
+                    ' -fo=origin -fd=smina' % results
+                )
+                replies = md_manage.send_requests(
+                    socket_path,
+                    [
+                        ['lb', results, 'label1', '-lv=value1', '--json-lines'],
+                        {'line': se_line},
+                        ['lb', results],
+                        ['batch'],
+                        ['lb', results, 'label2'],
+                    ],
+                )
+                self.assertEqual(
+                    [reply['ok'] for reply in replies], [True, True, False, False, True]
+                )
+                self.assertEqual(replies[0], {'ok': True, 'file': anno_file})
+                self.assertIn('label', replies[2]['error'])
+                self.assertEqual(stat.S_IMODE(os.stat(socket_path).st_mode), 0o600)
+
+                # A client that sends too long a line is dropped, and the others are served.
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+                    client.connect(socket_path)
+                    client.settimeout(5)
+                    try:
+                        for _ in range(md_manage._MAX_BUFFER_SIZE // 65536 + 2):
+                            client.sendall(b'x' * 65536)
+                        dropped = client.recv(1) == b''
+                    except (BrokenPipeError, ConnectionResetError):
+                        dropped = True
+                    self.assertTrue(dropped)
+                replies = md_manage.send_requests(socket_path, [['lb', results]])
+                self.assertEqual(replies[0]['ok'], False)
+
+                # A line that is not UTF-8 gets an error reply, and help is replied with.
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+                    client.connect(socket_path)
+                    client.sendall(b'{"args": ["lb", "\xff"]}\n')
+                    with client.makefile('r', encoding='utf-8') as reply_file:
+                        reply = json.loads(reply_file.readline())
+                self.assertEqual(reply['ok'], False)
+                replies = md_manage.send_requests(socket_path, [['lb', '-h']])
+                self.assertEqual(replies[0]['ok'], False)
+                self.assertIn('usage:', replies[0]['error'])
+
+                # A second server does not take over the socket of a running server.
+                with self.assertRaises(md_manage.CommandError):
+                    md_manage.AnnotationServer(socket_path).serve_forever()
+                self.assertTrue(os.path.exists(socket_path))
+
+                # The requests arrived together and were written as one JSON Lines file,
+                # which is then kept open and appended to.
+                self.assertIn(anno_file, server._open_files)
+                replies = md_manage.send_requests(socket_path, [{'line': se_line}])
+                self.assertEqual(replies, [{'ok': True, 'file': anno_file}])
+                with open(anno_file, 'rt') as annotations:
+                    rows = [json.loads(line) for line in annotations]
+                service_execution = 'ServiceExecutionAnnotation'
+                self.assertEqual(
+                    [row.get('label', row['type']) for row in rows],
+                    ['label1', service_execution, 'label2', service_execution],
+                )
+
+                # A file replaced behind the server's back is added to, not lost.
+                os.replace(anno_file, anno_file + '.old')
+                replies = md_manage.send_requests(
+                    socket_path, [['lb', results, 'label3']]
+                )
+                self.assertEqual(replies[0]['ok'], True)
+                with open(anno_file, 'rt') as annotations:
+                    self.assertEqual(
+                        next(iter_annotations(annotations))['label'], 'label3'
+                    )
+
+                self.assertEqual(
+                    md_manage.send_requests(socket_path, [{'shutdown': True}]),
+                    [{'ok': True}],
+                )
+            finally:
+                server.shutdown()
+                thread.join(5)
+            self.assertFalse(thread.is_alive())
+            self.assertFalse(os.path.exists(socket_path))
+
+            # A stale socket is replaced, and a socket that has replaced the server's own is
+            # left when the server stops.
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as stale:
+                stale.bind(socket_path)
+            server = md_manage.AnnotationServer(socket_path)
+            thread = threading.Thread(target=server.serve_forever)
+            thread.start()
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as other:
+                try:
+                    for _ in range(100):
+                        if server._running:
+                            break
+                        time.sleep(0.01)
+                    self.assertEqual(
+                        md_manage.send_requests(socket_path, [['lb', results]])[0][
+                            'ok'
+                        ],
+                        False,
+                    )
+                    os.unlink(socket_path)
+                    other.bind(socket_path)
+                finally:
+                    server.shutdown()
+                    thread.join(5)
+                self.assertTrue(os.path.exists(socket_path))
+        print('\nTest 31 ok')
+
+    def test_32_baseline_pickle(self):
+        print('\n32. Test loading metadata pickled by the baseline classes')
+        # The pickle was written by the classes before they had __slots__ and
+        # private annotation and label lists.
+        with open('test/input/baseline-metadata.pickle', 'rb') as pickle_file:
+            metadata = pickle.load(pickle_file)
+
+        metadata_dict = metadata.to_dict()
+        self.assertEqual(metadata_dict['dataset_id'], 'D-0001')
+        self.assertEqual(
+            [row['type'] for row in metadata_dict['annotations']],
+            ['FieldsDescriptorAnnotation', 'ServiceExecutionAnnotation'],
+        )
+        self.assertEqual(
+            metadata.get_compiled_fields()['fields']['smiles'],
+            {
+                'type': 'string',
+                'description': 'Smiles',
+                'required': True,
+                'active': True,
+            },
+        )
+        self.assertEqual(metadata.annotations[1].get_service_parameters(), {'a': 'b'})
+        self.assertEqual(
+            [label['label'] for label in metadata.get_labels()], ['size', 'colour']
+        )
+
+        # The loaded metadata can be changed and pickled again.
+        metadata.add_label(LabelAnnotation('colour', 'blue'))
+        reloaded = pickle.loads(pickle.dumps(metadata))
+        self.assertEqual(reloaded.to_dict(), metadata.to_dict())
+        self.assertEqual(reloaded.fingerprint(), metadata.fingerprint())
+        print('\nTest 32 ok')
 
 
 if __name__ == '__main__':